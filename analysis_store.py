@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import EXPANSION_RATIO
+from utils.image_processing import crop_boxes, decode_image, load_rgb
+
+
+class Analysis:
+    """
+    Artifacts of one /analyze run, kept so follow-up requests don't need to re-upload images.
+    The X-ray is kept encoded (upload bytes, or the path of the stored upload) and only
+    decoded when a report is built; crops are cut again from it at the detected boxes.
+    """
+
+    def __init__(self, analysis_id, image, boxes, predictions):
+        self.analysis_id = analysis_id
+        self.image = image  # Encoded upload bytes or a file path
+        self.boxes = boxes
+        self.predictions = predictions
+        self.created_at = time.time()
+
+    def load_image(self):
+        if isinstance(self.image, (bytes, bytearray)):
+            return decode_image(self.image)
+        return load_rgb(self.image)
+
+    def load_crops(self, image):
+        return crop_boxes(image, self.boxes, EXPANSION_RATIO)
+
+
+class AnalysisStore:
+    """In-memory store of recent analyses, bounded by entry count and age."""
+
+    def __init__(self, max_entries=32, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, analysis_id, image, boxes, predictions):
+        analysis = Analysis(analysis_id, image, boxes, predictions)
+        with self._lock:
+            self._entries.pop(analysis_id, None)
+            self._entries[analysis_id] = analysis
+            self._expire_locked()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return analysis
+
+    def get(self, analysis_id):
+        """Return the Analysis, or None if it is unknown or expired."""
+        with self._lock:
+            self._expire_locked()
+            analysis = self._entries.get(analysis_id)
+            if analysis is not None:
+                self._entries.move_to_end(analysis_id)
+            return analysis
+
+    def __contains__(self, analysis_id):
+        return self.get(analysis_id) is not None
+
+    def _expire_locked(self):
+        cutoff = time.time() - self.ttl
+        expired = [key for key, analysis in self._entries.items() if analysis.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
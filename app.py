@@ -1,20 +1,38 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, g
 from flask_cors import CORS
-from datetime import datetime
 import os
 import base64
 from PIL import Image
 from io import BytesIO
-import shutil
 import uuid
 import json
+import zipfile
+import time
+import logging
+import multiprocessing
 
-from detector import detect_and_crop
-from binary_classifier import binary_filter_teeth
-from disease_classifier import classify_teeth
-from utils.image_processing import save_annotated_images, draw_boxes
-from utils.report_generator import generate_pdf_report
-from bb_filering import bounding_box_filter_iou, bounding_box_filter_center, hybrid_filter
+from config import (
+    JOB_WORKERS, JOB_MAX_PENDING, JOB_RESULT_TTL_S, COMPACT_THUMBNAIL_SIZE,
+    DETECTION_CONF, TOOTH_PROB_THRESHOLD, IOU_THRESHOLD, MAX_DETECTIONS, EXPANSION_RATIO,
+    DETECTION_MODE, DETECTION_LARGE_SIDE, DETECTION_IMGSZ, TILE_SIZE, TILE_OVERLAP, TILE_MERGE_OVERLAP,
+    RESULT_CACHE_ENABLED, RESULT_CACHE_MEMORY_MAX_BYTES, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES,
+    ANALYSIS_STORE_MAX_ENTRIES, ANALYSIS_STORE_TTL_S, REPORT_WORKERS, REPORT_CACHE_MAX_AGE_S,
+    CLASSIFIER_BACKEND, DETECTOR_BACKEND, BATCH_MAX_IMAGES, BATCH_MAX_ARCHIVE_BYTES, LOG_LEVEL,
+    PERSIST_WORKERS, PERSIST_MAX_PENDING, STORAGE_MAX_AGE_S, STORAGE_MAX_BYTES, STORAGE_CLEANUP_INTERVAL_S, STORAGE_SHARD_DEPTH,
+)
+import metrics
+from profiling import profiled, is_active as profiling_active
+from analysis_store import AnalysisStore
+from backends import model_files
+from inference import detect_teeth, classify_detected, classify_single, analyze_images, start_model_loading, readiness
+from jobs import BoundedExecutor, JobManager, JobQueueFull, JOB_DONE, JOB_FAILED
+from result_cache import AnalysisCache, config_fingerprint
+from report_pool import ReportRenderPool, report_filename, report_id_for, REPORT_DONE, REPORT_FAILED
+from storage import StorageManager
+from utils.image_processing import decode_image, annotate_image, iter_tooth_annotations, get_disease_color, make_thumbnail
+
+logging.basicConfig(level=LOG_LEVEL)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 # CORS(app)
@@ -29,32 +47,158 @@ CORS(app, supports_credentials=True, origins=["http://localhost:3000", "http://1
 UPLOAD_FOLDER = 'uploads'
 STORAGE_FOLDER = 'stored_xrays'  # Permanent storage for original xrays
 REPORTS_FOLDER = 'reports'  # Folder for generated PDF reports
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(STORAGE_FOLDER, exist_ok=True)
-os.makedirs(REPORTS_FOLDER, exist_ok=True)
+CROPS_FOLDER = 'saved_crops'  # Per-request subfolders of cropped teeth
+ANNOTATED_FOLDER = 'annotated_xrays_single_tooth'  # Output of save_annotated_images
 
-def encode_image_base64(image: Image.Image) -> str:
-    """Convert PIL image to base64 string."""
+# Every artifact directory is hash-sharded and shares one retention policy
+storage = StorageManager(STORAGE_MAX_AGE_S, STORAGE_MAX_BYTES, STORAGE_CLEANUP_INTERVAL_S, STORAGE_SHARD_DEPTH)
+upload_storage = storage.area('uploads', UPLOAD_FOLDER)
+xray_storage = storage.area('stored_xrays', STORAGE_FOLDER)
+report_storage = storage.area('reports', REPORTS_FOLDER)
+crop_storage = storage.area('saved_crops', CROPS_FOLDER)
+storage.area('annotated', ANNOTATED_FOLDER)
+
+# Load and warm the models (in the background by default) so startup stays fast.
+# Spawned helper processes re-import this module, so only the serving process does it.
+if multiprocessing.parent_process() is None:
+    start_model_loading()
+    storage.start_cleaner()
+
+# Background writer for artifacts that don't need to block the response. Bounded, so
+# writes that fall behind slow requests down instead of piling up images in memory.
+persist_executor = BoundedExecutor(PERSIST_WORKERS, PERSIST_MAX_PENDING, name="persist")
+
+# Bounded background executor for /analyze/jobs
+analysis_jobs = JobManager(JOB_WORKERS, JOB_MAX_PENDING, JOB_RESULT_TTL_S)
+
+# Serialized /analyze results keyed by upload hash and model/threshold configuration
+result_cache = AnalysisCache(
+    config_fingerprint(
+        {
+            "detection_conf": DETECTION_CONF,
+            "tooth_prob_threshold": TOOTH_PROB_THRESHOLD,
+            "iou_threshold": IOU_THRESHOLD,
+            "max_detections": MAX_DETECTIONS,
+            "expansion_ratio": EXPANSION_RATIO,
+            "detection_mode": DETECTION_MODE,
+            "detection_large_side": DETECTION_LARGE_SIDE,
+            "detection_imgsz": DETECTION_IMGSZ,
+            "tile_size": TILE_SIZE,
+            "tile_overlap": TILE_OVERLAP,
+            "tile_merge_overlap": TILE_MERGE_OVERLAP,
+            "compact_thumbnail_size": COMPACT_THUMBNAIL_SIZE,
+            "classifier_backend": CLASSIFIER_BACKEND,
+            "detector_backend": DETECTOR_BACKEND,
+        },
+        weight_paths=model_files(),
+    ),
+    memory_max_bytes=RESULT_CACHE_MEMORY_MAX_BYTES,
+    disk_dir=RESULT_CACHE_DIR,
+    disk_max_bytes=RESULT_CACHE_DISK_MAX_BYTES,
+)
+
+# Artifacts of recent analyses, so reports can be generated by analysis ID
+analysis_store = AnalysisStore(ANALYSIS_STORE_MAX_ENTRIES, ANALYSIS_STORE_TTL_S)
+
+# PDF rendering happens in worker processes; identical inputs map to the same report
+report_pool = ReportRenderPool(report_storage, REPORT_WORKERS)
+
+def encode_image_jpeg(image: Image.Image) -> bytes:
+    """Encode PIL image as JPEG bytes."""
     buffered = BytesIO()
     image.save(buffered, format="JPEG")
-    encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return buffered.getvalue()
+
+def encode_image_base64(image: Image.Image) -> str:
+    """Convert PIL image to base64 string."""
+    encoded = base64.b64encode(encode_image_jpeg(image)).decode("utf-8")
     return f"data:image/jpeg;base64,{encoded}"
 
+class MultipartImages:
+    """Collects JPEG parts for a multipart/mixed response and hands out cid: references."""
+
+    def __init__(self):
+        self.parts = []
+
+    def __call__(self, image: Image.Image) -> str:
+        content_id = f"image-{len(self.parts)}"
+        self.parts.append((content_id, encode_image_jpeg(image)))
+        return f"cid:{content_id}"
+
+    def response(self, document):
+        """Build a multipart/mixed response: the JSON document first, then one part per image."""
+        boundary = uuid.uuid4().hex
+        chunks = [
+            f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode(),
+            json.dumps(document).encode(),
+        ]
+        for content_id, data in self.parts:
+            chunks.append(
+                f"\r\n--{boundary}\r\nContent-Type: image/jpeg\r\n"
+                f"Content-ID: <{content_id}>\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+            )
+            chunks.append(data)
+        chunks.append(f"\r\n--{boundary}--\r\n".encode())
+        return Response(b"".join(chunks), mimetype=f"multipart/mixed; boundary={boundary}")
+
+# === Request metrics ===
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_token, g.metrics_events = metrics.start_recording()
+
+
+@app.after_request
+def add_server_timing(response):
+    # Streamed bodies are produced after this runs, so their timings would be meaningless
+    if 'metrics_start' not in g or response.is_streamed:
+        return response
+    total = time.perf_counter() - g.metrics_start
+    metrics.request_seconds.observe(total, endpoint=request.endpoint or 'unmatched')
+    response.headers['Server-Timing'] = metrics.server_timing(g.metrics_events, total)
+    return response
+
+
+@app.teardown_request
+def stop_request_metrics(exc):
+    if 'metrics_token' in g:
+        metrics.stop_recording(g.metrics_token)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Process is up; says nothing about the models
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    ready, details = readiness()
+    return jsonify(dict(details, ready=ready)), 200 if ready else 503
+
+
 @app.route('/disease_classify', methods=['POST'])
+@profiled
 def disease_classify():
     if 'image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
 
     image = request.files['image']
-    filename = datetime.now().strftime("%Y%m%d%H%M%S") + '_' + image.filename
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    image.save(filepath)
+
+    # Everything below works on this request's in-memory image only
+    image_bytes = image.read()
+    img = decode_image(image_bytes)
+    persist_executor.submit(upload_storage.put_content, image_bytes, upload_extension(image.filename))
 
     # Single tooth classification
-    prediction = classify_teeth(filepath)  # Assuming classify_teeth can handle single images
+    prediction = classify_single(img)
     
     # Create a dummy bounding box for the whole image
-    img = Image.open(filepath).convert("RGB")
     width, height = img.size
     box = {
         'x1': 20,
@@ -64,17 +208,12 @@ def disease_classify():
         'disease': prediction["disease"]
     }
     
-    # Create annotated image
-    output_dir = "annotated_xrays_single_tooth"
-    os.makedirs(output_dir, exist_ok=True)
-    annotated_path = os.path.join(output_dir, "single_tooth.jpg")
-    
-    # Call draw_boxes to create annotated image with disease-specific color
-    draw_boxes(filepath, [box], annotated_path)
+    # Create annotated image with disease-specific color
+    annotated_img = annotate_image(img, [box])
     
     # Convert the images to base64
     image_base64 = encode_image_base64(img)
-    annotated_base64 = encode_image_base64(Image.open(annotated_path).convert("RGB"))
+    annotated_base64 = encode_image_base64(annotated_img)
 
     # Return single result
     return jsonify({
@@ -89,88 +228,447 @@ def disease_classify():
     })
 
 
-@app.route('/analyze', methods=['POST'])
-def analyze():
-    if 'image' not in request.files:
-        return jsonify({'error': 'No image uploaded'}), 400
+def start_analysis(image_bytes, upload_name):
+    """Decode an upload once and persist it in the background. Returns (request_id, image)."""
+    request_id = uuid.uuid4().hex
 
-    try:
-        image = request.files['image']
-        filename = datetime.now().strftime("%Y%m%d%H%M%S") + '_' + image.filename
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        storage_path = os.path.join(STORAGE_FOLDER, filename)
-        image.save(filepath)
-
-        # Step 1: YOLO detection
-        initial_crops, boxes_info = detect_and_crop(filepath)
-
-        # Step 2: Binary classifier filtering
-        filtered = binary_filter_teeth(initial_crops)
-        filtered_indices = [idx for idx, _ in filtered]
-        filtered_crops = [crop for _, crop in filtered]
-        filtered_boxes = [boxes_info[i] for i in filtered_indices]
-
-        # Step 3: Bounding box filtering: 3 different options
-        # Option A: IOU only
-        filtered_boxes, filtered_crops = bounding_box_filter_iou(filtered_boxes, filtered_crops)
-
-        # Option B: Midpoint only
-        # filtered_boxes, filtered_crops = bounding_box_filter_center(filtered_boxes, filtered_crops)
-
-        # Option C: Hybrid
-        # filtered_boxes, filtered_crops = hybrid_filter(filtered_boxes, filtered_crops)
-        # print("[DEBUG] After bounding box filtering")
-
-        # Step 4: Multiclass disease classification
-        predictions = classify_teeth(filtered_crops)
-        # print("[DEBUG] After classify_teeth")
-        
-        # Step 5: Add disease classifications to bounding boxes for color coding
-        for i, pred in enumerate(predictions):
-            filtered_boxes[i]['disease'] = pred['disease']
-        
-        # Save annotated images of NEW filtered boxes with disease-based colors
-        save_annotated_images(filepath, filtered_boxes)
-        # print("[DEBUG] After save_annotated_images")
-        
-        # Save cropped teeth of NEW filtered teeth
-        save_cropped_teeth(filtered_crops)
-        # print("[DEBUG] After save_cropped_teeth")
+    # Decode the upload once; every stage below shares this image
+    original_img = decode_image(image_bytes)
 
-        # Step 6: Attach base64-encoded images
-        results = []
-        for idx, (crop, pred) in enumerate(zip(filtered_crops, predictions)):
-            # Get the individual annotated image for this tooth
-            individual_annotated_path = os.path.join('annotated_xrays_single_tooth', f'tooth_{idx}.jpg')
-            individual_annotated = Image.open(individual_annotated_path)
-            
-            results.append({
+    # Persist the original X-ray off the response path; identical uploads are stored once
+    persist_executor.submit(xray_storage.put_content, image_bytes, upload_extension(upload_name))
+
+    return request_id, original_img
+
+
+def iter_analysis(image_bytes, upload_name, analysis_id=None):
+    """
+    Run the /analyze pipeline stage by stage, yielding (event, data) pairs as results
+    become available: 'detection' once boxes are filtered, one 'tooth' per classified
+    tooth, then 'final' with the full-size images and the analysis ID.
+    """
+    request_id, original_img = start_analysis(image_bytes, upload_name)
+    analysis_id = analysis_id or result_cache.content_key(image_bytes)
+
+    # Steps 1-3: detection and filtering
+    filtered_boxes, filtered_crops = detect_teeth(original_img)
+    yield "detection", {
+        "boxes": [dict(box, id=idx) for idx, box in enumerate(filtered_boxes)]
+    }
+
+    # Steps 4-5: disease classification
+    predictions = classify_detected(filtered_boxes, filtered_crops)
+    record_analysis(request_id, analysis_id, image_bytes, upload_name, filtered_boxes, filtered_crops, predictions)
+
+    # Render annotations in memory from the decoded X-ray
+    tooth_annotations = iter_tooth_annotations(original_img, filtered_boxes)
+
+    # Per-tooth work is interleaved, so each stage is timed across the loop
+    annotation = metrics.StageTimer("annotation")
+    encoding = metrics.StageTimer("encoding")
+
+    # Step 6: Attach base64-encoded images
+    for idx, (crop, pred) in enumerate(zip(filtered_crops, predictions)):
+        with annotation:
+            individual_annotated = next(tooth_annotations)
+        with encoding:
+            tooth = {
                 "id": idx,
                 "image": encode_image_base64(crop),
                 "annotatedImage": encode_image_base64(individual_annotated),
                 "disease": pred["disease"],
                 "confidence": round(pred["confidence"], 4)
-            })
+            }
+        yield "tooth", tooth
 
-        # Get the final annotated image
-        final_annotated = Image.open(os.path.join('annotated_xrays_single_tooth', 'final_yolo_output.jpg'))
-        
-        # Move original file to permanent storage
-        shutil.move(filepath, storage_path)
-        
-        return jsonify({
-            "originalImage": encode_image_base64(Image.open(storage_path).convert("RGB")),
+    # Get the final annotated image
+    with annotation:
+        final_annotated = annotate_image(original_img, filtered_boxes)
+    
+    with encoding:
+        final = {
+            "analysisId": analysis_id,
+            "originalImage": encode_image_base64(original_img),
             "annotatedImage": encode_image_base64(final_annotated),
-            "detectedTeeth": results
+        }
+    annotation.record()
+    encoding.record()
+    yield "final", final
+
+
+def run_analysis(image_bytes, upload_name, analysis_id=None):
+    """Run the full /analyze pipeline on uploaded bytes and return the response payload."""
+    results = []
+    payload = {}
+    for event, data in iter_analysis(image_bytes, upload_name, analysis_id):
+        if event == "tooth":
+            results.append(data)
+        elif event == "final":
+            payload.update(data)
+
+    payload["detectedTeeth"] = results
+    return payload
+
+
+def record_analysis(request_id, analysis_id, image_bytes, upload_name, boxes, crops, predictions):
+    """
+    Keep what report generation needs and save the crops, scoped to the request. The
+    store holds the encoded upload; the result cache gets a record of the boxes,
+    predictions and stored upload path, so other processes (and this one after a
+    restart, with the disk tier) can rebuild the analysis on a cache hit.
+    """
+    analysis_store.put(analysis_id, image_bytes, boxes, predictions)
+    if RESULT_CACHE_ENABLED:
+        record = {
+            'xray': xray_storage.content_path(image_bytes, upload_extension(upload_name)),
+            'boxes': boxes,
+            'predictions': predictions,
+        }
+        result_cache.put(result_cache.variant_key(analysis_id, "analysis"), app.json.dumps(record).encode())
+
+    # Save cropped teeth of NEW filtered teeth, scoped to this request
+    persist_executor.submit(save_request_crops, crops, request_id)
+
+
+def restore_analysis(analysis_id):
+    """
+    The stored Analysis, or one rebuilt from its result cache record if this process
+    does not have it (evicted, another worker ran it, or a restart). None if neither exists.
+    """
+    analysis = analysis_store.get(analysis_id)
+    if analysis is not None or not RESULT_CACHE_ENABLED:
+        return analysis
+
+    record = result_cache.peek(result_cache.variant_key(analysis_id, "analysis"))
+    if record is None:
+        return None
+    record = json.loads(record)
+    if not os.path.exists(record['xray']):
+        return None  # Upload not written yet or removed by retention
+    return analysis_store.put(analysis_id, record['xray'], record['boxes'], record['predictions'])
+
+
+def compact_payload(analysis_id, original_img, boxes, crops, predictions, encode_image=encode_image_base64):
+    """
+    Compact /analyze payload: the original X-ray once, plus box coordinates, disease
+    colors and small crop thumbnails per tooth instead of full-size annotated copies.
+    """
+    with metrics.stage("encoding"):
+        return _compact_payload(analysis_id, original_img, boxes, crops, predictions, encode_image)
+
+
+def _compact_payload(analysis_id, original_img, boxes, crops, predictions, encode_image):
+    results = []
+    for idx, (box, crop, pred) in enumerate(zip(boxes, crops, predictions)):
+        results.append({
+            "id": idx,
+            "box": {key: box[key] for key in ('x1', 'y1', 'x2', 'y2')},
+            "color": "#%02x%02x%02x" % get_disease_color(pred["disease"]),
+            "thumbnail": encode_image(make_thumbnail(crop, COMPACT_THUMBNAIL_SIZE)),
+            "disease": pred["disease"],
+            "confidence": round(pred["confidence"], 4)
         })
 
+    width, height = original_img.size
+    return {
+        "analysisId": analysis_id,
+        "originalImage": encode_image(original_img),
+        "width": width,
+        "height": height,
+        "detectedTeeth": results
+    }
+
+
+def run_compact_analysis(image_bytes, upload_name, analysis_id=None, encode_image=encode_image_base64):
+    """Run the pipeline on uploaded bytes and return the compact /analyze payload."""
+    request_id, original_img = start_analysis(image_bytes, upload_name)
+    analysis_id = analysis_id or result_cache.content_key(image_bytes)
+
+    filtered_boxes, filtered_crops = detect_teeth(original_img)
+    predictions = classify_detected(filtered_boxes, filtered_crops)
+    record_analysis(request_id, analysis_id, image_bytes, upload_name, filtered_boxes, filtered_crops, predictions)
+
+    return compact_payload(analysis_id, original_img, filtered_boxes, filtered_crops, predictions, encode_image)
+
+
+def analysis_json(image_bytes, upload_name, compact=False):
+    """Serialized /analyze payload, served from the result cache for previously seen uploads."""
+    run = run_compact_analysis if compact else run_analysis
+    analysis_id = result_cache.content_key(image_bytes)
+    if not RESULT_CACHE_ENABLED:
+        return app.json.dumps(run(image_bytes, upload_name, analysis_id)).encode()
+
+    key = result_cache.variant_key(analysis_id, "compact" if compact else "full")
+    # A cached response is only served if its analysis can be restored, so the
+    # analysisId it carries stays valid for report generation. Profiled requests
+    # always run the pipeline.
+    body = None
+    if not profiling_active():
+        body = result_cache.get(key, valid=lambda _: restore_analysis(analysis_id) is not None)
+    if body is None:
+        body = app.json.dumps(run(image_bytes, upload_name, analysis_id)).encode()
+        result_cache.put(key, body)
+    return body
+
+
+# === Multi-image series ===
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+class BatchTooLarge(Exception):
+    pass
+
+
+def read_batch_uploads():
+    """(filename, bytes) pairs from repeated 'images' parts and/or a zip 'archive' part."""
+    uploads = [(f.filename, f.read()) for f in request.files.getlist('images')]
+
+    if 'archive' in request.files:
+        with zipfile.ZipFile(BytesIO(request.files['archive'].read())) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and not os.path.basename(info.filename).startswith('.')
+                and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            if sum(info.file_size for info in members) > BATCH_MAX_ARCHIVE_BYTES:
+                raise BatchTooLarge(f'Archive expands to more than {BATCH_MAX_ARCHIVE_BYTES} bytes')
+            uploads.extend((os.path.basename(info.filename), archive.read(info)) for info in members)
+
+    if len(uploads) > BATCH_MAX_IMAGES:
+        raise BatchTooLarge(f'At most {BATCH_MAX_IMAGES} images per batch')
+    return uploads
+
+
+def analyze_uploads(uploads):
+    """
+    Analyze a series of uploads together: YOLO runs per group of same-size images and
+    all crops share classifier batches. Returns one (analysis_id, image, boxes, crops,
+    predictions) tuple per upload, or the exception if the upload could not be decoded.
+    """
+    started = []
+    for upload_name, image_bytes in uploads:
+        try:
+            started.append(start_analysis(image_bytes, upload_name))
+        except Exception as e:
+            started.append(e)
+
+    decoded = [i for i, item in enumerate(started) if not isinstance(item, Exception)]
+    analyses = analyze_images([started[i][1] for i in decoded]) if decoded else []
+
+    results = list(started)
+    for i, (boxes, crops, predictions) in zip(decoded, analyses):
+        request_id, original_img = started[i]
+        upload_name, image_bytes = uploads[i]
+        analysis_id = result_cache.content_key(image_bytes)
+        record_analysis(request_id, analysis_id, image_bytes, upload_name, boxes, crops, predictions)
+        results[i] = (analysis_id, original_img, boxes, crops, predictions)
+    return results
+
+
+def batch_analysis_json(uploads):
+    """Serialized /analyze_batch payload; each image's compact result goes through the result cache."""
+    analysis_ids = [result_cache.content_key(data) for _, data in uploads]
+    keys = [result_cache.variant_key(analysis_id, "compact") for analysis_id in analysis_ids]
+    bodies = [None] * len(uploads)
+    if RESULT_CACHE_ENABLED:
+        for i, analysis_id in enumerate(analysis_ids):
+            bodies[i] = result_cache.get(keys[i], valid=lambda _: restore_analysis(analysis_id) is not None)
+
+    misses = [i for i, body in enumerate(bodies) if body is None]
+    for i, analysis in zip(misses, analyze_uploads([uploads[i] for i in misses])):
+        if isinstance(analysis, Exception):
+            bodies[i] = app.json.dumps({'error': str(analysis)}).encode()
+            continue
+        bodies[i] = app.json.dumps(compact_payload(*analysis)).encode()
+        if RESULT_CACHE_ENABLED:
+            result_cache.put(keys[i], bodies[i])
+
+    # Splice the per-image bodies in as-is so cached entries are not re-parsed
+    entries = [
+        b'{"filename":' + app.json.dumps(name).encode() + b',"result":' + body + b'}'
+        for (name, _), body in zip(uploads, bodies)
+    ]
+    return b'{"results":[' + b','.join(entries) + b']}'
+
+
+class ChunkSink:
+    """Write-only file object that hands out what has been written so far, for streaming a zip."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ArchiveImages:
+    """Writes each image into the archive as a JPEG member and returns its path."""
+
+    def __init__(self, archive, prefix):
+        self.archive = archive
+        self.prefix = prefix
+        self.count = 0
+
+    def __call__(self, image: Image.Image) -> str:
+        name = f"{self.prefix}/image-{self.count}.jpg"
+        self.count += 1
+        self.archive.writestr(name, encode_image_jpeg(image))
+        return name
+
+
+def stream_batch_archive(uploads, analyses):
+    """Yield a zip archive with each image's JPEGs followed by results.json, one image at a time."""
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        results = []
+        for idx, ((upload_name, _), analysis) in enumerate(zip(uploads, analyses)):
+            if isinstance(analysis, Exception):
+                result = {'error': str(analysis)}
+            else:
+                result = compact_payload(*analysis, encode_image=ArchiveImages(archive, f"{idx:02d}"))
+            results.append({'filename': upload_name, 'result': result})
+            yield sink.drain()
+        archive.writestr("results.json", json.dumps({'results': results}), zipfile.ZIP_DEFLATED)
+    yield sink.drain()
+
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/analyze', methods=['POST'])
+@profiled
+def analyze():
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    try:
+        image = request.files['image']
+        compact = request.args.get('format') == 'compact'
+
+        # Compact mode with the images as raw JPEG parts instead of base64 (not cached)
+        if compact and request.args.get('transport') == 'multipart':
+            parts = MultipartImages()
+            return parts.response(run_compact_analysis(image.read(), image.filename, encode_image=parts))
+        return json_response(analysis_json(image.read(), image.filename, compact))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    image = request.files['image']
+    image_bytes = image.read()
+    upload_name = image.filename
+
+    def generate():
+        try:
+            for event, data in iter_analysis(image_bytes, upload_name):
+                yield format_sse(event, data)
+            yield format_sse("done", {})
+        except Exception as e:
+            yield format_sse("error", {'error': str(e)})
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Keep reverse proxies from buffering the stream
+    })
+
+
+@app.route('/analyze/jobs', methods=['POST'])
+def submit_analysis_job():
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    image = request.files['image']
+    try:
+        job_id = analysis_jobs.submit(analysis_json, image.read(), image.filename)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/analyze/jobs/{job_id}',
+        'result_url': f'/analyze/jobs/{job_id}/result'
+    }), 202
+
+
+@app.route('/analyze/jobs/<job_id>', methods=['GET'])
+def analysis_job_status(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.status_dict())
+
+
+@app.route('/analyze/jobs/<job_id>/result', methods=['GET'])
+def analysis_job_result(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if job.status == JOB_FAILED:
+        return jsonify({'error': job.error}), 500
+    if job.status != JOB_DONE:
+        return jsonify(job.status_dict()), 202
+    return json_response(job.result)
+
+
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    try:
+        uploads = read_batch_uploads()
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Archive is not a valid zip file'}), 400
+    if not uploads:
+        return jsonify({'error': 'No images uploaded'}), 400
+
+    try:
+        # Images as JPEG members of a streamed zip instead of base64 (not cached)
+        if request.args.get('format') == 'zip':
+            analyses = analyze_uploads(uploads)
+            return Response(stream_batch_archive(uploads, analyses), mimetype='application/zip', headers={
+                'Content-Disposition': 'attachment; filename=analysis.zip'
+            })
+        return json_response(batch_analysis_json(uploads))
+
     except Exception as e:
-        # Clean up upload file only if error occurs and file exists
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'error': str(e)}), 500
 
-def save_cropped_teeth(crops, output_dir="saved_crops"):
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+def upload_extension(upload_name):
+    """File extension for a stored upload, kept only if it is a known image type."""
+    extension = os.path.splitext(upload_name or '')[1].lower()
+    return extension if extension in IMAGE_EXTENSIONS else ''
+
+def save_request_crops(crops, request_id):
+    return save_cropped_teeth(crops, crop_storage.directory(request_id))
+
+def save_cropped_teeth(crops, output_dir=CROPS_FOLDER):
     os.makedirs(output_dir, exist_ok=True)
     saved_paths = []
     for idx, crop in enumerate(crops):
@@ -181,7 +679,67 @@ def save_cropped_teeth(crops, output_dir="saved_crops"):
     return saved_paths
 
 
+def render_report(report_id, report_data):
+    """
+    Render a PDF report on the report pool. Waits for it unless the request asked
+    for ?async=1, in which case the client polls the status URL instead. report_data
+    may be a function building it, so reports already on disk skip building it.
+    """
+    body = {
+        'success': True,
+        'report_id': report_id,
+        'download_url': f'/download_report/{report_id}',
+        'status_url': f'/report_status/{report_id}'
+    }
+
+    # Profiled requests render here so ReportLab shows up in the profile
+    if profiling_active():
+        report_pool.render_here(report_id, report_data)
+        return jsonify(dict(body, status=REPORT_DONE))
+
+    future = report_pool.submit(report_id, report_data)
+    if future is not None and request.args.get('async') == '1':
+        return jsonify(dict(body, status='pending')), 202
+    if future is not None:
+        future.result()
+    return jsonify(dict(body, status=REPORT_DONE))
+
+
+def build_report_data(analysis, overrides):
+    """
+    Report input from a stored analysis. Supported overrides:
+      teeth: {"<tooth id>": {"disease": "..."}} to correct predicted diseases
+      exclude: [tooth ids] to leave teeth out of the report
+    """
+    tooth_overrides = {str(key): value for key, value in (overrides.get('teeth') or {}).items()}
+    excluded = {str(tooth_id) for tooth_id in overrides.get('exclude') or []}
+
+    original_img = analysis.load_image()
+    crops = analysis.load_crops(original_img)
+
+    boxes = []
+    teeth_by_disease = {}
+    for idx, (box, crop, pred) in enumerate(zip(analysis.boxes, crops, analysis.predictions)):
+        if str(idx) in excluded:
+            continue
+        disease = tooth_overrides.get(str(idx), {}).get('disease', pred['disease'])
+        boxes.append(dict(box, disease=disease))
+        teeth_by_disease.setdefault(disease, []).append({
+            'id': idx,
+            'image': crop,
+            'disease': disease,
+            'confidence': round(pred['confidence'], 4)
+        })
+
+    return {
+        'original_image': original_img,
+        'annotated_image': annotate_image(original_img, boxes),
+        'teeth_by_disease': teeth_by_disease
+    }
+
+
 @app.route('/generate_report', methods=['POST'])
+@profiled
 def generate_report():
     try:
         # Parse JSON data from request
@@ -191,22 +749,9 @@ def generate_report():
             return jsonify({'error': 'No data provided'}), 400
         
         # Debug: Log received data structure
-        print("[DEBUG] Report data keys:", data.keys())
-        
-        # Create a unique report ID
-        report_id = str(uuid.uuid4())
-        report_filename = f"dental_report_{report_id}.pdf"
-        report_path = os.path.join(REPORTS_FOLDER, report_filename)
+        logger.debug("Report data keys: %s", list(data.keys()))
         
-        # Generate the PDF report
-        generate_pdf_report(data, report_path)
-        
-        # Return the path to download the report
-        return jsonify({
-            'success': True,
-            'report_id': report_id,
-            'download_url': f'/download_report/{report_id}'
-        })
+        return render_report(report_id_for(data), data)
     
     except Exception as e:
         import traceback
@@ -215,27 +760,67 @@ def generate_report():
         print(f"[ERROR] Traceback: {error_traceback}")
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/analysis/<analysis_id>/report', methods=['POST'])
+@profiled
+def generate_report_for_analysis(analysis_id):
+    analysis = restore_analysis(analysis_id)
+    if analysis is None:
+        return jsonify({'error': 'Unknown or expired analysis'}), 404
+
+    try:
+        overrides = request.get_json(silent=True) or {}
+        report_id = report_id_for(analysis_id, overrides)
+        # Built only if the report has to be rendered, not when it is already on disk
+        return render_report(report_id, lambda: build_report_data(analysis, overrides))
+
+    except Exception as e:
+        print(f"[ERROR] Report generation failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/report_status/<report_id>', methods=['GET'])
+def report_status(report_id):
+    status, error = report_pool.status(report_id)
+    if status is None:
+        return jsonify({'error': 'Unknown report'}), 404
+
+    body = {'report_id': report_id, 'status': status}
+    if status == REPORT_DONE:
+        body['download_url'] = f'/download_report/{report_id}'
+    if status == REPORT_FAILED:
+        body['error'] = error
+    return jsonify(body)
+
+
 @app.route('/download_report/<report_id>', methods=['GET'])
 def download_report(report_id):
     try:
-        report_filename = f"dental_report_{report_id}.pdf"
-        report_path = os.path.join(REPORTS_FOLDER, report_filename)
+        # Sharded location first, then the flat layout of reports rendered before sharding
+        report_path = report_pool.existing_path(report_id)
         
-        print(f"[DEBUG] Looking for report at: {report_path}")
-        print(f"[DEBUG] File exists: {os.path.exists(report_path)}")
+        logger.debug("Looking for report %s at: %s", report_id, report_path)
         
-        if not os.path.exists(report_path):
+        if report_path is None:
             return send_file(
                 '404.html',
                 mimetype='text/html'
             ), 404
         
-        return send_file(
-            report_path,
+        # Rendered reports never change, so the report ID is a strong ETag.
+        # conditional=True answers If-None-Match with 304 and Range requests with 206.
+        response = send_file(
+            os.path.abspath(report_path),
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=report_filename
+            download_name=report_filename(report_id),
+            conditional=True,
+            etag=report_id,
+            max_age=REPORT_CACHE_MAX_AGE_S
         )
+        # Patient data: only the requesting browser may cache it
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
     
     except Exception as e:
         print(f"[ERROR] Error serving report: {str(e)}")
@@ -243,4 +828,5 @@ def download_report(report_id):
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Requests no longer share on-disk artifacts, so they can be served concurrently
+    app.run(debug=True, port=5000, threaded=True)
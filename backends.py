@@ -0,0 +1,127 @@
+import os
+
+from config import (
+    CLASSIFIER_BACKEND, DETECTOR_BACKEND, DETECTOR_WEIGHTS, BINARY_WEIGHTS, DISEASE_WEIGHTS,
+    EXPORT_DIR, QUANTIZATION_ENGINE,
+)
+
+CLASSIFIER_BACKENDS = ("eager", "torchscript", "compile", "onnx", "quantized")
+DETECTOR_BACKENDS = ("pytorch", "torchscript", "onnx")
+
+# File suffix of exported models per format (ultralytics recognizes these for YOLO too)
+EXPORT_SUFFIXES = {"torchscript": ".torchscript", "onnx": ".onnx"}
+# External weights file torch.onnx.export writes next to the .onnx graph
+ONNX_DATA_SUFFIX = ".data"
+# INT8 classifiers are saved as TorchScript, next to the other exports
+QUANTIZED_SUFFIX = ".int8.torchscript"
+
+# FP32 weights per classifier, for the cache fingerprint.
+# torch is imported inside the loaders: the web process imports this module for the
+# fingerprint only and never loads torch when inference runs in worker processes.
+CLASSIFIER_WEIGHTS = {"binary_classifier": BINARY_WEIGHTS, "disease_classifier": DISEASE_WEIGHTS}
+
+
+def exported_path(name, fmt):
+    """Where the export command writes, and the backends read, an exported model."""
+    return os.path.join(EXPORT_DIR, f"{name}{EXPORT_SUFFIXES[fmt]}")
+
+
+def quantized_path(name):
+    """Where quantize_models.py writes, and the quantized backend reads, an INT8 classifier."""
+    return os.path.join(EXPORT_DIR, f"{name}{QUANTIZED_SUFFIX}")
+
+
+def set_quantization_engine(engine=QUANTIZATION_ENGINE):
+    import torch
+    if engine not in torch.backends.quantized.supported_engines:
+        raise RuntimeError(f"Quantization engine '{engine}' not supported here, expected one of {torch.backends.quantized.supported_engines}")
+    torch.backends.quantized.engine = engine
+
+
+def _require_export(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run `python export_models.py` to create it")
+
+
+class OnnxClassifier:
+    """ONNX Runtime session with the call signature of the eager model: tensor in, logits out."""
+
+    def __init__(self, path):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx backend needs onnxruntime (`pip install onnxruntime`)") from e
+
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        import torch
+        outputs = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+
+def load_classifier(name, build_eager, backend=CLASSIFIER_BACKEND):
+    """
+    Return a callable mapping an N x 3 x 224 x 224 batch to logits for the chosen backend.
+    build_eager builds the eager PyTorch model from its state dict.
+    """
+    import torch
+    if backend == "eager":
+        return build_eager()
+    if backend == "compile":
+        return torch.compile(build_eager())
+    if backend == "torchscript":
+        path = exported_path(name, "torchscript")
+        _require_export(path)
+        model = torch.jit.load(path, map_location="cpu")
+        model.eval()
+        return model
+    if backend == "onnx":
+        path = exported_path(name, "onnx")
+        _require_export(path)
+        return OnnxClassifier(path)
+    if backend == "quantized":
+        path = quantized_path(name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run `python quantize_models.py` to create it")
+        set_quantization_engine()
+        model = torch.jit.load(path, map_location="cpu")
+        model.eval()
+        return model
+    raise ValueError(f"Unknown classifier backend '{backend}', expected one of {CLASSIFIER_BACKENDS}")
+
+
+def detector_weights_path(backend=DETECTOR_BACKEND):
+    """Weights file for the YOLO wrapper; ultralytics runs exported .torchscript/.onnx files natively."""
+    if backend == "pytorch":
+        return DETECTOR_WEIGHTS
+    if backend in EXPORT_SUFFIXES:
+        path = exported_path("detector", backend)
+        _require_export(path)
+        return path
+    raise ValueError(f"Unknown detector backend '{backend}', expected one of {DETECTOR_BACKENDS}")
+
+
+def classifier_model_path(name, backend=CLASSIFIER_BACKEND):
+    """File the classifier backend loads its weights from."""
+    if backend in ("eager", "compile"):
+        return CLASSIFIER_WEIGHTS[name]
+    if backend == "quantized":
+        return quantized_path(name)
+    return exported_path(name, backend)
+
+
+def model_files():
+    """Every weights file the configured backends load, so re-exporting or re-calibrating invalidates cached results."""
+    paths = (
+        DETECTOR_WEIGHTS if DETECTOR_BACKEND == "pytorch" else exported_path("detector", DETECTOR_BACKEND),
+        classifier_model_path("binary_classifier"),
+        classifier_model_path("disease_classifier"),
+    )
+    # Large ONNX exports keep their weights in an external data file next to the graph
+    sidecars = tuple(
+        path + ONNX_DATA_SUFFIX for path in paths
+        if path.endswith(EXPORT_SUFFIXES["onnx"]) and os.path.exists(path + ONNX_DATA_SUFFIX)
+    )
+    return paths + sidecars
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# When set, map() runs batch_fn in the calling thread (e.g. so a request profiler sees it)
+_inline = ContextVar("micro_batcher_inline", default=False)
+
+
+@contextmanager
+def run_inline():
+    """Make every MicroBatcher.map in this context run in the calling thread."""
+    token = _inline.set(True)
+    try:
+        yield
+    finally:
+        _inline.reset(token)
+
+
+class MicroBatcher:
+    """
+    Cross-request dynamic batching in front of a batched model call.
+
+    Callers submit items from any thread and get one future per item back.
+    A single background thread collects queued items until it has
+    max_batch_size of them or max_wait_ms has passed since the first one,
+    then runs batch_fn once over the whole batch. batch_fn takes a list of
+    items and returns a list of results in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5, name="micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, items):
+        """Queue items for batched execution and return their futures."""
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        if futures:
+            self._ensure_started()
+        return futures
+
+    def map(self, items):
+        """Submit items and block until all of their results are available."""
+        if _inline.get():
+            results = []
+            for start in range(0, len(items), self.max_batch_size):
+                results.extend(self.batch_fn(items[start:start + self.max_batch_size]))
+            return results
+        return [future.result() for future in self.submit(items)]
+
+    def _ensure_started(self):
+        # Started lazily so importing a model module never spawns threads
+        # (keeps forked/spawned worker processes clean)
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [
+                (item, future) for item, future in self._collect_batch()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
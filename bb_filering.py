@@ -1,5 +1,9 @@
+import logging
+
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 # === Extract coords from dict box ===
 def box_to_xyxy(box):
     return [box["x1"], box["y1"], box["x2"], box["y2"]]
@@ -21,26 +25,65 @@ def compute_iou(boxA, boxB):
     iou = interArea / float(boxAArea + boxBArea - interArea + 1e-6)
     return iou
 
-# === IOU Filtering ===
-def bounding_box_filter_iou(boxes, crops, iou_threshold=0.1):
-    keep_boxes = []
-    keep_crops = []
+# === Array-backed IOU Filtering ===
+def boxes_to_array(boxes):
+    """Stack dict boxes into an N x 4 float array of (x1, y1, x2, y2)."""
+    if not boxes:
+        return np.empty((0, 4), dtype=np.float64)
+    return np.array([box_to_xyxy(box) for box in boxes], dtype=np.float64)
 
-    # Sort by box area descending
-    sorted_items = sorted(zip(boxes, crops), key=lambda x: 
-        (x[0]["x2"] - x[0]["x1"]) * (x[0]["y2"] - x[0]["y1"]), reverse=True)
+def iou_matrix(xyxy):
+    """Pairwise IOU for an N x 4 box array, same formula as compute_iou."""
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
 
-    while sorted_items:
-        current_box, current_crop = sorted_items.pop(0)
-        keep_boxes.append(current_box)
-        keep_crops.append(current_crop)
+    inter_w = np.maximum(0, np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]))
+    inter_h = np.maximum(0, np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]))
+    inter = inter_w * inter_h
 
-        sorted_items = [
-            (box, crop) for box, crop in sorted_items
-            if compute_iou(current_box, box) < iou_threshold
-        ]
+    return inter / (areas[:, None] + areas[None, :] - inter + 1e-6)
+
+def overlap_matrix(xyxy):
+    """Pairwise intersection over the smaller box's area, so a box inside another scores 1."""
+    x1, y1, x2, y2 = xyxy[:, 0], xyxy[:, 1], xyxy[:, 2], xyxy[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+
+    inter_w = np.maximum(0, np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]))
+    inter_h = np.maximum(0, np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]))
+    inter = inter_w * inter_h
+
+    return inter / (np.minimum(areas[:, None], areas[None, :]) + 1e-6)
+
+def suppress_indices(xyxy, overlaps, threshold, scores=None):
+    """
+    Greedy suppression given a pairwise N x N overlap matrix, in descending order of
+    scores (e.g. confidence), or of area when no scores are given.
+    Returns kept indices in keep order.
+    """
+    if scores is None:
+        scores = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    # Stable sort keeps the original order for equal scores, like sorted(reverse=True)
+    order = np.argsort(-np.asarray(scores), kind="stable")
+
+    suppressed = np.zeros(len(xyxy), dtype=bool)
+    keep = []
+    for idx in order:
+        if suppressed[idx]:
+            continue
+        keep.append(idx)
+        suppressed |= overlaps[idx] >= threshold
+
+    return np.array(keep, dtype=np.intp)
 
-    return keep_boxes, keep_crops
+def filter_iou_indices(xyxy, iou_threshold=0.1):
+    """Greedy area-descending IOU suppression on an N x 4 box array."""
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    return suppress_indices(xyxy, iou_matrix(xyxy), iou_threshold)
+
+# === IOU Filtering ===
+def bounding_box_filter_iou(boxes, crops, iou_threshold=0.1):
+    keep = filter_iou_indices(boxes_to_array(boxes), iou_threshold)
+    return [boxes[i] for i in keep], [crops[i] for i in keep]
 
 # === Midpoint Filtering ===
 def get_center(box):
@@ -48,25 +91,49 @@ def get_center(box):
     cy = (box["y1"] + box["y2"]) / 2
     return cx, cy
 
-def bounding_box_filter_center(boxes, crops, min_dist=100):
-    # The bigger min_dist is, the more filtering occurs and the less duplicates we have.
-    keep_boxes = []
-    keep_crops = []
-    centers = []
+def box_centers(xyxy):
+    """Centers of an N x 4 box array as an N x 2 array."""
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    return np.column_stack(((xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2))
 
-    for box, crop in zip(boxes, crops):
-        cx, cy = get_center(box)
-        too_close = any(np.hypot(cx - px, cy - py) < min_dist for px, py in centers)
-        if not too_close:
-            keep_boxes.append(box)
-            keep_crops.append(crop)
-            centers.append((cx, cy))
+def filter_center_indices(centers, min_dist=100):
+    """
+    First-come greedy center filter: a center is kept unless it lies closer
+    than min_dist to an already kept one. Kept centers are bucketed in a grid
+    of min_dist-sized cells, so each check only looks at the 3x3 neighbourhood.
+    Returns kept indices in input order.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    if min_dist <= 0:
+        return np.arange(len(centers), dtype=np.intp)
 
-    return keep_boxes, keep_crops
+    cells = np.floor(centers / min_dist).astype(np.int64).tolist()
+    grid = {}
+    keep = []
+    for idx, (cx, cy) in enumerate(centers.tolist()):
+        gx, gy = cells[idx]
+        nearby = [
+            j
+            for dx in (-1, 0, 1)
+            for dy in (-1, 0, 1)
+            for j in grid.get((gx + dx, gy + dy), ())
+        ]
+        if nearby and np.any(np.hypot(cx - centers[nearby, 0], cy - centers[nearby, 1]) < min_dist):
+            continue
+        keep.append(idx)
+        grid.setdefault((gx, gy), []).append(idx)
+
+    return np.array(keep, dtype=np.intp)
+
+def bounding_box_filter_center(boxes, crops, min_dist=100):
+    # The bigger min_dist is, the more filtering occurs and the less duplicates we have.
+    keep = filter_center_indices(box_centers(boxes_to_array(boxes)), min_dist)
+    return [boxes[i] for i in keep], [crops[i] for i in keep]
 
 # === Hybrid Filtering ===
 def hybrid_filter(boxes, crops, iou_threshold=0.5, min_dist=100):
-    print("[DEBUG] Running hybrid filtering...")
-    boxes_iou, crops_iou = bounding_box_filter_iou(boxes, crops, iou_threshold)
-    boxes_final, crops_final = bounding_box_filter_center(boxes_iou, crops_iou, min_dist)
-    return boxes_final, crops_final
+    logger.debug("Running hybrid filtering on %d boxes", len(boxes))
+    xyxy = boxes_to_array(boxes)
+    keep = filter_iou_indices(xyxy, iou_threshold)
+    keep = keep[filter_center_indices(box_centers(xyxy[keep]), min_dist)]
+    return [boxes[i] for i in keep], [crops[i] for i in keep]
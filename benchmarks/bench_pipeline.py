@@ -0,0 +1,226 @@
+"""
+Offline benchmark of the analysis pipeline, per function and end to end through the
+Flask test client. Uses synthetic panoramic X-rays and random-weight models, so it runs
+without the proprietary weights. Results are written as JSON for comparing runs.
+
+    python benchmarks/bench_pipeline.py --iterations 20 --teeth 32
+    python benchmarks/bench_pipeline.py --baseline benchmarks/results/<earlier run>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Settings that must be in place before the service modules read config.py
+BENCH_ENV = {
+    "DENTASSIST_MODEL_PRELOAD": "lazy",       # Stub models are installed instead
+    "DENTASSIST_RESULT_CACHE_ENABLED": "0",   # Every request runs the pipeline
+}
+
+
+# === Measurement ===
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+def measure(fn, iterations, warmup=1, items=1):
+    """Time fn() over iterations after warmup calls. items is the work per call, for throughput."""
+    for _ in range(warmup):
+        fn()
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+
+    durations.sort()
+    total = sum(durations)
+    return {
+        "iterations": iterations,
+        "items_per_call": items,
+        "mean_ms": round(total / iterations * 1000, 3),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "min_ms": round(durations[0] * 1000, 3),
+        "max_ms": round(durations[-1] * 1000, 3),
+        "throughput_per_s": round(items * iterations / total, 2) if total else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _settings():
+    import config
+    return {
+        name: getattr(config, name) for name in (
+            "CLASSIFIER_BACKEND", "CLASSIFIER_BATCH_SIZE", "SCHEDULER_ENABLED", "SCHEDULER_MAX_BATCH_SIZE",
+            "SCHEDULER_MAX_WAIT_MS", "DETECTION_MODE", "MAX_DETECTIONS", "INFERENCE_WORKERS",
+        )
+    }
+
+
+# === Benchmarks ===
+def run_benchmarks(args, workdir):
+    import torch
+    from synthetic import install_stub_models, synthetic_xray, jpeg_bytes
+
+    install_stub_models(args.teeth, None if args.yolo_cfg == "none" else args.yolo_cfg)
+
+    from app import app, encode_image_base64
+    from bb_filering import bounding_box_filter_iou, bounding_box_filter_center, hybrid_filter
+    from binary_classifier import binary_filter_teeth
+    from detector import detect_and_crop
+    from disease_classifier import classify_teeth
+    from utils.image_processing import annotate_image, save_annotated_images
+    from utils.report_generator import generate_pdf_report
+
+    image = synthetic_xray(args.width, args.height, args.teeth, seed=0)
+    upload = jpeg_bytes(image)
+    crops, boxes = detect_and_crop(image)
+    predictions = classify_teeth(crops)
+    tagged = [dict(box, disease=pred["disease"]) for box, pred in zip(boxes, predictions)]
+    teeth_by_disease = {}
+    for idx, (crop, pred) in enumerate(zip(crops, predictions)):
+        teeth_by_disease.setdefault(pred["disease"], []).append(
+            {"id": idx, "image": crop, "disease": pred["disease"], "confidence": pred["confidence"]}
+        )
+    report_data = {
+        "original_image": image,
+        "annotated_image": annotate_image(image, tagged),
+        "teeth_by_disease": teeth_by_disease,
+    }
+
+    n, warmup = args.iterations, args.warmup
+    functions = {
+        "detect_and_crop": (lambda: detect_and_crop(image), 1),
+        "binary_filter_teeth": (lambda: binary_filter_teeth(crops), len(crops)),
+        "bounding_box_filter_iou": (lambda: bounding_box_filter_iou(boxes, crops), len(boxes)),
+        "bounding_box_filter_center": (lambda: bounding_box_filter_center(boxes, crops), len(boxes)),
+        "hybrid_filter": (lambda: hybrid_filter(boxes, crops), len(boxes)),
+        "classify_teeth": (lambda: classify_teeth(crops), len(crops)),
+        "save_annotated_images": (
+            lambda: save_annotated_images(image, tagged, os.path.join(workdir, "annotated")), len(tagged)
+        ),
+        "encode_image_base64": (lambda: encode_image_base64(image), 1),
+        "generate_pdf_report": (lambda: generate_pdf_report(report_data, os.path.join(workdir, "report.pdf")), 1),
+    }
+
+    results = {}
+    for name, (fn, items) in functions.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"[INFO] Benchmarking {name}")
+        results[name] = measure(fn, n, warmup, items)
+
+    client = app.test_client()
+
+    def post_analyze(query=""):
+        response = client.post(f"/analyze{query}", data={"image": (BytesIO(upload), "synthetic.jpg")})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    endpoints = {
+        "e2e_analyze": lambda: post_analyze(),
+        "e2e_analyze_compact": lambda: post_analyze("?format=compact"),
+    }
+    for name, fn in endpoints.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"[INFO] Benchmarking {name}")
+        results[name] = measure(fn, n, warmup)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "image_size": [args.width, args.height],
+            "teeth": args.teeth,
+            "detected_boxes": len(boxes),
+            "yolo_cfg": args.yolo_cfg,
+            "settings": _settings(),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """Print p50/p95 of this run next to a baseline run."""
+    print(f"{'benchmark':<28} {'p50 ms':>10} {'base':>10} {'ratio':>7} {'p95 ms':>10} {'base':>10}")
+    for name, current in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:<28} {current['p50_ms']:>10.2f} {'-':>10}")
+            continue
+        ratio = current["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("nan")
+        print(f"{name:<28} {current['p50_ms']:>10.2f} {base['p50_ms']:>10.2f} {ratio:>6.2f}x "
+              f"{current['p95_ms']:>10.2f} {base['p95_ms']:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--teeth", type=int, default=32, help="Teeth drawn on each synthetic X-ray")
+    parser.add_argument("--width", type=int, default=2900)
+    parser.add_argument("--height", type=int, default=1400)
+    parser.add_argument("--yolo-cfg", default="yolov8n.yaml",
+                        help="Ultralytics config for the random-weight detector, or 'none' to skip its forward pass")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("--output", help="JSON output path (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier JSON output to compare against")
+    args = parser.parse_args(argv)
+
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+
+    # The app writes uploads, crops and reports relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="dentassist-bench-")
+    output = os.path.abspath(args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    ))
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(workdir)
+
+    report = run_benchmarks(args, workdir)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Wrote {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            compare(report, json.load(f))
+    else:
+        compare(report, {})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Concurrent load test against a running instance, with synthetic X-rays only.
+
+Drives /analyze (full and compact), /disease_classify, /generate_report and
+/download_report with a weighted mix, at one or more concurrency levels, either
+closed-loop (each client sends its next request as soon as the last one returns) or
+at a fixed Poisson arrival rate. Records throughput, error rate, latency percentiles
+and server RSS over time, and checks every image in every response for cross-request
+corruption.
+
+    python benchmarks/serve_stub.py --port 5000 &
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 5 20 50 --duration 60
+    python benchmarks/load_test.py --rate 4 --mix analyze=3,disease_classify=1 --slo analyze=8000
+
+Corruption detection: every upload is tinted with a colour marker that no other
+in-flight request uses. Colour survives cropping, thumbnailing, annotation and JPEG
+re-encoding, so each returned image is checked for its own request's marker.
+"""
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from urllib.parse import urlsplit
+
+import numpy as np
+import psutil
+import requests
+from PIL import Image
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import jpeg_bytes, synthetic_xray, tooth_layout  # noqa: E402
+
+ENDPOINTS = ("analyze", "analyze_compact", "disease_classify", "generate_report", "download_report")
+DEFAULT_MIX = "analyze=4,analyze_compact=2,disease_classify=2,generate_report=1,download_report=1"
+
+
+# === Colour markers ===
+# A marker is a (red, blue) offset from the green channel. Grey levels are squeezed
+# into a band that leaves room for the offsets, so no channel clips.
+MARKER_STEP = 8
+MARKER_LEVELS = range(-32, 33, MARKER_STEP)
+MARKERS = [(r, b) for r in MARKER_LEVELS for b in MARKER_LEVELS if (r, b) != (0, 0)]
+
+
+def tint(grey, marker):
+    """RGB image from a 2-D uint8 array with the marker's channel offsets applied."""
+    base = 40 + grey.astype(np.int32) * 175 // 255
+    red, blue = marker
+    return Image.fromarray(np.stack([base + red, base, base + blue], axis=-1).astype(np.uint8))
+
+
+def read_marker(image):
+    """Nearest marker to the median channel offsets of an image, or None if untinted."""
+    pixels = np.asarray(image.convert("RGB"), dtype=np.int16).reshape(-1, 3)
+    red = np.median(pixels[:, 0] - pixels[:, 1])
+    blue = np.median(pixels[:, 2] - pixels[:, 1])
+    snap = lambda value: int(round(value / MARKER_STEP) * MARKER_STEP)
+    marker = (snap(red), snap(blue))
+    return marker if marker in MARKERS else None
+
+
+class MarkerPool:
+    """Hands out markers not used by any in-flight request, least recently used first."""
+
+    def __init__(self):
+        self._free = deque(MARKERS)
+        self._lock = threading.Condition()
+
+    def acquire(self):
+        with self._lock:
+            while not self._free:
+                self._lock.wait()
+            return self._free.popleft()
+
+    def release(self, marker):
+        with self._lock:
+            self._free.append(marker)
+            self._lock.notify()
+
+
+class Uploads:
+    """Pre-encoded tinted X-rays and tooth crops for every marker."""
+
+    def __init__(self, width, height, teeth):
+        grey = np.asarray(synthetic_xray(width, height, teeth, seed=0).convert("L"))
+        x1, y1, x2, y2 = (int(v) for v in tooth_layout(width, height, teeth)[teeth // 4])
+        tooth = grey[y1:y2, x1:x2]
+        self.xrays = {marker: jpeg_bytes(tint(grey, marker)) for marker in MARKERS}
+        self.teeth = {marker: jpeg_bytes(tint(tooth, marker)) for marker in MARKERS}
+        self._sequence = itertools.count()
+
+    def tag(self):
+        return f"load-test-{next(self._sequence)}"
+
+    def unique(self, data):
+        """
+        The same JPEG with a unique trailer after the end-of-image marker. Decoders ignore
+        it, but it gives every request new bytes, so the result cache does not answer it.
+        """
+        return data + self.tag().encode()
+
+
+def decode_base64(value):
+    return Image.open(BytesIO(base64.b64decode(value.split("base64,")[-1])))
+
+
+def check_images(images, marker):
+    """Names of the (name, base64) images that do not carry the request's marker."""
+    return [name for name, value in images if read_marker(decode_base64(value)) != marker]
+
+
+# === Requests ===
+class LoadClient:
+    """Sends one request per call and returns (HTTP status, names of corrupted images)."""
+
+    def __init__(self, url, uploads, timeout):
+        self.url = url.rstrip("/")
+        self.uploads = uploads
+        self.timeout = timeout
+        self.markers = MarkerPool()
+        self.reports = deque(maxlen=256)  # Recently rendered report IDs
+        self.report_hashes = {}  # Report ID -> sha256 of its first download
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # One connection pool per client thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, endpoint):
+        if endpoint == "download_report" and not self.reports:
+            endpoint = "generate_report"  # Nothing rendered yet to download
+        marker = self.markers.acquire()
+        try:
+            return getattr(self, endpoint)(marker)
+        finally:
+            self.markers.release(marker)
+
+    def _post_image(self, path, data, marker):
+        response = self.session.post(
+            self.url + path, files={"image": (f"xray-{marker[0]}-{marker[1]}.jpg", self.uploads.unique(data))},
+            timeout=self.timeout,
+        )
+        return response, (response.json() if response.ok else None)
+
+    def analyze(self, marker):
+        response, body = self._post_image("/analyze", self.uploads.xrays[marker], marker)
+        if body is None:
+            return response.status_code, []
+        images = [("originalImage", body["originalImage"]), ("annotatedImage", body["annotatedImage"])]
+        for tooth in body["detectedTeeth"]:
+            images.append((f"tooth {tooth['id']} image", tooth["image"]))
+            images.append((f"tooth {tooth['id']} annotatedImage", tooth["annotatedImage"]))
+        return response.status_code, check_images(images, marker)
+
+    def analyze_compact(self, marker):
+        response, body = self._post_image("/analyze?format=compact", self.uploads.xrays[marker], marker)
+        if body is None:
+            return response.status_code, []
+        images = [("originalImage", body["originalImage"])]
+        images.extend((f"tooth {tooth['id']} thumbnail", tooth["thumbnail"]) for tooth in body["detectedTeeth"])
+        return response.status_code, check_images(images, marker)
+
+    def disease_classify(self, marker):
+        response, body = self._post_image("/disease_classify", self.uploads.teeth[marker], marker)
+        if body is None:
+            return response.status_code, []
+        images = [("originalImage", body["originalImage"]), ("annotatedImage", body["annotatedImage"])]
+        images.extend((f"tooth {tooth['id']} image", tooth["image"]) for tooth in body["detectedTeeth"])
+        return response.status_code, check_images(images, marker)
+
+    def generate_report(self, marker):
+        xray = base64.b64encode(self.uploads.xrays[marker]).decode()
+        tooth = base64.b64encode(self.uploads.teeth[marker]).decode()
+        payload = {
+            "originalImage": xray,
+            "annotatedImage": xray,
+            "teethByDisease": {"Caries": [{"id": 0, "image": tooth, "disease": "Caries", "confidence": 0.9}]},
+            # Report IDs hash the payload; a unique tag makes the service render every report
+            "loadTestRequest": self.uploads.tag(),
+        }
+        response = self.session.post(self.url + "/generate_report", json=payload, timeout=self.timeout)
+        if response.ok:
+            self.reports.append(response.json()["report_id"])
+        return response.status_code, []
+
+    def download_report(self, marker):
+        report_id = random.choice(self.reports)
+        response = self.session.get(f"{self.url}/download_report/{report_id}", timeout=self.timeout)
+        if not response.ok:
+            return response.status_code, []
+        if not response.content.startswith(b"%PDF"):
+            return response.status_code, ["not a PDF"]
+        # A report never changes once rendered, so every download must match the first
+        digest = hashlib.sha256(response.content).hexdigest()
+        first = self.report_hashes.setdefault(report_id, digest)
+        return response.status_code, [] if first == digest else ["differs from an earlier download"]
+
+
+# === Server memory ===
+def find_server_pid(url):
+    """PID listening on the URL's port, if it is a local process we can see."""
+    port = urlsplit(url).port or 80
+    try:
+        for conn in psutil.net_connections(kind="tcp"):
+            if conn.status == psutil.CONN_LISTEN and conn.laddr.port == port and conn.pid:
+                return conn.pid
+    except psutil.AccessDenied:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Samples the server's RSS, and that of its child processes, at a fixed interval."""
+
+    def __init__(self, pid, interval, started):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.started = started
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                rss = self.process.memory_info().rss
+                children = 0
+                for child in self.process.children(recursive=True):
+                    try:
+                        children += child.memory_info().rss
+                    except psutil.Error:
+                        pass
+            except psutil.Error:
+                break
+            self.samples.append({
+                "t": round(time.perf_counter() - self.started, 2),
+                "rss_mb": round(rss / 2**20, 1),
+                "children_rss_mb": round(children / 2**20, 1),
+            })
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# === Load stages ===
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+def parse_weights(text, names):
+    weights = {}
+    for item in text.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() not in names:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name.strip()!r}, expected one of {', '.join(names)}")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+def run_stage(client, concurrency, duration, rate, mix, started):
+    """
+    Run one load level. Closed-loop without a rate; otherwise requests are scheduled at
+    Poisson arrivals and latency is measured from the scheduled time, so time spent
+    queued behind busy clients counts (no coordinated omission).
+    """
+    endpoints, weights = zip(*mix.items())
+    records = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def one(endpoint, scheduled):
+        error, corrupted = None, []
+        try:
+            status, corrupted = client.send(endpoint)
+        except Exception as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+        finished = time.perf_counter()
+        with lock:
+            records.append({
+                "endpoint": endpoint,
+                "t": finished - started,
+                "latency": finished - scheduled,
+                "status": status,
+                "error": error,
+                "corrupted": corrupted,
+            })
+
+    def closed_loop():
+        while time.perf_counter() < deadline:
+            one(random.choices(endpoints, weights)[0], time.perf_counter())
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if rate:
+            scheduled = time.perf_counter()
+            while scheduled < deadline:
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                executor.submit(one, random.choices(endpoints, weights)[0], scheduled)
+                scheduled += random.expovariate(rate)
+        else:
+            for _ in range(concurrency):
+                executor.submit(closed_loop)
+    elapsed = time.perf_counter() - (deadline - duration)
+    return records, elapsed
+
+
+def summarize(records, elapsed, slo):
+    def stats(items):
+        latencies = sorted(r["latency"] for r in items)
+        errors = [r for r in items if r["error"] or not r["status"] or r["status"] >= 400]
+        corrupted = [r for r in items if r["corrupted"]]
+        ms = lambda value: round(value * 1000, 1) if value is not None else None
+        return {
+            "requests": len(items),
+            "throughput_per_s": round(len(items) / elapsed, 2),
+            "error_rate": round(len(errors) / len(items), 4) if items else 0.0,
+            "corrupted": len(corrupted),
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p90_ms": ms(percentile(latencies, 90)),
+            "p95_ms": ms(percentile(latencies, 95)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+        }
+
+    summary = {"overall": stats(records), "endpoints": {}}
+    for endpoint in ENDPOINTS:
+        items = [r for r in records if r["endpoint"] == endpoint]
+        if not items:
+            continue
+        summary["endpoints"][endpoint] = stats(items)
+        if endpoint in slo:
+            p95 = summary["endpoints"][endpoint]["p95_ms"]
+            summary["endpoints"][endpoint]["slo_p95_ms"] = slo[endpoint]
+            summary["endpoints"][endpoint]["slo_met"] = p95 is not None and p95 <= slo[endpoint]
+
+    # Completions and failures per second, for plotting against RSS
+    timeline = {}
+    for r in records:
+        second = timeline.setdefault(int(r["t"]), {"t": int(r["t"]), "completed": 0, "errors": 0})
+        second["completed"] += 1
+        second["errors"] += bool(r["error"] or not r["status"] or r["status"] >= 400)
+    summary["timeline"] = [timeline[t] for t in sorted(timeline)]
+
+    summary["errors"] = {}
+    for r in records:
+        if r["error"] or not r["status"] or r["status"] >= 400:
+            key = f"{r['endpoint']}: {r['error'] or r['status']}"
+            summary["errors"][key] = summary["errors"].get(key, 0) + 1
+    summary["corruption_examples"] = [
+        {"endpoint": r["endpoint"], "images": r["corrupted"][:5]} for r in records if r["corrupted"]
+    ][:20]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[5, 20, 50], help="Client counts, one stage each")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per stage")
+    parser.add_argument("--rate", type=float, help="Poisson arrival rate in requests/s (default: closed loop)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--slo", default="", help="p95 latency targets in ms, e.g. analyze=8000,disease_classify=500")
+    parser.add_argument("--width", type=int, default=2900)
+    parser.add_argument("--height", type=int, default=1400)
+    parser.add_argument("--teeth", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--server-pid", type=int, help="Server PID for RSS sampling (default: whoever listens on the port)")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Seconds between RSS samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON output path (default benchmarks/results/load_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_weights(args.mix, ENDPOINTS)
+        slo = parse_weights(args.slo, ENDPOINTS) if args.slo else {}
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    random.seed(args.seed)
+
+    print(f"[INFO] Preparing synthetic uploads for {len(MARKERS)} markers")
+    client = LoadClient(args.url, Uploads(args.width, args.height, args.teeth), args.timeout)
+    if max(args.concurrency) >= len(MARKERS):
+        parser.error(f"concurrency must stay below {len(MARKERS)} so in-flight requests have distinct markers")
+
+    pid = args.server_pid or find_server_pid(args.url)
+    if pid is None:
+        print("[INFO] Server process not found; RSS will not be recorded (pass --server-pid)")
+
+    started = time.perf_counter()
+    sampler = RssSampler(pid, args.sample_interval, started) if pid else None
+    if sampler:
+        sampler.start()
+
+    stages = []
+    for concurrency in args.concurrency:
+        print(f"[INFO] {concurrency} clients for {args.duration:g}s" + (f" at {args.rate:g} req/s" if args.rate else ""))
+        stage_started = time.perf_counter() - started
+        records, elapsed = run_stage(client, concurrency, args.duration, args.rate, mix, started)
+        summary = summarize(records, elapsed, slo)
+        stages.append(dict(concurrency=concurrency, started_s=round(stage_started, 2),
+                           elapsed_s=round(elapsed, 2), **summary))
+        overall = summary["overall"]
+        print(f"[INFO]   {overall['requests']} requests, {overall['throughput_per_s']} req/s, "
+              f"errors {overall['error_rate']:.2%}, corrupted {overall['corrupted']}, "
+              f"p50 {overall['p50_ms']}ms, p95 {overall['p95_ms']}ms")
+        for endpoint, result in summary["endpoints"].items():
+            slo_note = ""
+            if "slo_met" in result:
+                slo_note = f" (SLO {result['slo_p95_ms']:g}ms {'met' if result['slo_met'] else 'MISSED'})"
+            print(f"[INFO]   {endpoint:<17} n={result['requests']:<5} p50 {result['p50_ms']}ms "
+                  f"p95 {result['p95_ms']}ms errors {result['error_rate']:.2%}{slo_note}")
+
+    if sampler:
+        sampler.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "url": args.url,
+            "duration_s": args.duration,
+            "rate": args.rate,
+            "mix": mix,
+            "slo_p95_ms": slo,
+            "image_size": [args.width, args.height],
+            "server_pid": pid,
+        },
+        "stages": stages,
+        "rss": sampler.samples if sampler else [],
+    }
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"load_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Wrote {output}")
+
+    corrupted = sum(stage["overall"]["corrupted"] for stage in stages)
+    missed = [f"{stage['concurrency']}:{name}" for stage in stages
+              for name, result in stage["endpoints"].items() if result.get("slo_met") is False]
+    if corrupted:
+        print(f"[ERROR] {corrupted} responses contained another request's images")
+    if missed:
+        print(f"[ERROR] p95 SLO missed for {', '.join(missed)}")
+    return 1 if corrupted or missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
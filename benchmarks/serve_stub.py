@@ -0,0 +1,38 @@
+"""
+Run the service with the random-weight stand-in models from synthetic.py, so the load
+test can drive a real HTTP server without the proprietary weights.
+
+    python benchmarks/serve_stub.py --port 5000
+"""
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--teeth", type=int, default=32, help="Teeth the stub detector reports per X-ray")
+    parser.add_argument("--yolo-cfg", default="yolov8n.yaml",
+                        help="Ultralytics config for the random-weight detector, or 'none' to skip its forward pass")
+    parser.add_argument("--workdir", default=".", help="Directory the service writes uploads, crops and reports to")
+    args = parser.parse_args(argv)
+
+    # Stub models are installed instead of loading the real weights
+    os.environ.setdefault("DENTASSIST_MODEL_PRELOAD", "lazy")
+    os.chdir(args.workdir)
+
+    from synthetic import install_stub_models
+    install_stub_models(args.teeth, None if args.yolo_cfg == "none" else args.yolo_cfg)
+
+    from app import app
+    print(f"[INFO] Serving stub models on http://{args.host}:{args.port} (pid {os.getpid()})")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Synthetic X-rays and stand-in models, so benchmarks and load tests run without the
+proprietary weights. Nothing here is imported by the service itself.
+"""
+import math
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw, ImageFilter
+from torch import nn
+from torchvision import models
+
+# Typical panoramic radiograph size
+PANORAMIC_SIZE = (2900, 1400)
+
+
+# === Synthetic radiographs ===
+def tooth_layout(width, height, teeth=32):
+    """
+    Boxes (x1, y1, x2, y2) for teeth laid out along an upper and a lower arch.
+    Deterministic in (width, height, teeth), so the stub detector can find them again.
+    """
+    upper = (teeth + 1) // 2
+    lower = teeth - upper
+    tooth_w = width * 0.7 / max(upper, 1)
+    tooth_h = height * 0.3
+
+    boxes = []
+    for count, center_y, direction in ((upper, height * 0.33, 1), (lower, height * 0.67, -1)):
+        for i in range(count):
+            t = (i + 0.5) / count  # 0..1 along the arch
+            cx = width * 0.15 + t * width * 0.7
+            # The arch bends towards the middle of the image at both ends
+            cy = center_y + direction * (1 - math.sin(math.pi * t)) * height * 0.08
+            boxes.append((cx - tooth_w * 0.42, cy - tooth_h / 2, cx + tooth_w * 0.42, cy + tooth_h / 2))
+    return boxes
+
+
+def synthetic_xray(width=PANORAMIC_SIZE[0], height=PANORAMIC_SIZE[1], teeth=32, seed=0):
+    """A grayscale-looking RGB radiograph: bright rounded teeth on a dark, noisy jaw."""
+    rng = np.random.default_rng(seed)
+    background = rng.normal(40, 12, (height, width)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(background)  # 2-D uint8 -> mode "L"
+
+    draw = ImageDraw.Draw(img)
+    for x1, y1, x2, y2 in tooth_layout(width, height, teeth):
+        shade = int(rng.integers(150, 230))
+        draw.rounded_rectangle((x1, y1, x2, y2), radius=(x2 - x1) / 3, fill=shade)
+        # Darker pulp canal, where lesions would show up
+        mid = (x1 + x2) / 2
+        draw.rectangle((mid - (x2 - x1) * 0.08, y1 + (y2 - y1) * 0.2, mid + (x2 - x1) * 0.08, y2 - (y2 - y1) * 0.2), fill=shade - 70)
+
+    return img.filter(ImageFilter.GaussianBlur(radius=3)).convert("RGB")
+
+
+def jpeg_bytes(image, quality=90):
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+# === Stand-in models ===
+class _Boxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = xyxy
+        self.conf = conf
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubDetector:
+    """
+    Callable like an ultralytics YOLO model. Runs a random-weight YOLO (if given) so the
+    forward pass costs what the real one does, then reports the synthetic tooth layout
+    plus one jittered duplicate per tooth, so the box filters have work to do.
+    """
+
+    def __init__(self, teeth=32, yolo=None, seed=0):
+        self.teeth = teeth
+        self.yolo = yolo
+        self.seed = seed
+
+    def __call__(self, source, conf=0.25, **kwargs):
+        sources = source if isinstance(source, list) else [source]
+        if self.yolo is not None:
+            self.yolo(sources, conf=conf, verbose=False, **{k: v for k, v in kwargs.items() if k != "verbose"})
+
+        results = []
+        for image in sources:
+            height, width = image.shape[:2] if isinstance(image, np.ndarray) else image.size[::-1]
+            boxes = np.array(tooth_layout(width, height, self.teeth), dtype=np.float32).reshape(-1, 4)
+            rng = np.random.default_rng(self.seed)
+            jitter = rng.normal(0, 0.05, boxes.shape).astype(np.float32) * (boxes[:, 2:3] - boxes[:, 0:1])
+            xyxy = np.concatenate([boxes, boxes + jitter])
+            confs = np.concatenate([rng.uniform(0.5, 0.95, len(boxes)), rng.uniform(0.05, 0.5, len(boxes))])
+            results.append(_Result(_Boxes(torch.from_numpy(xyxy), torch.from_numpy(confs.astype(np.float32)))))
+        return results
+
+
+def random_resnet18(num_outputs, seed=0):
+    """ResNet18 head with the service's architecture and random weights."""
+    torch.manual_seed(seed)
+    model = models.resnet18(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_outputs)
+    return model.eval()
+
+
+def random_yolo(cfg="yolov8n.yaml"):
+    """Random-weight YOLO built from an ultralytics model config (no download needed)."""
+    from ultralytics import YOLO
+    return YOLO(cfg, task="detect")
+
+
+def install_stub_models(teeth=32, yolo_cfg="yolov8n.yaml"):
+    """
+    Register stand-in models with the service's model registry. yolo_cfg=None skips the
+    YOLO forward pass entirely, leaving only the stub's post-processing cost.
+    """
+    import pipeline  # noqa: F401  Registers the real loaders first, so the overrides below win
+    from disease_classifier import class_names
+    from model_registry import registry
+
+    binary = random_resnet18(1, seed=1)
+    with torch.no_grad():
+        binary.fc.bias.fill_(2.0)  # Keep most crops, like the real filter does on real teeth
+
+    registry.override("detector", StubDetector(teeth, random_yolo(yolo_cfg) if yolo_cfg else None))
+    registry.override("binary_classifier", binary)
+    registry.override("disease_classifier", random_resnet18(len(class_names), seed=2))
@@ -1,15 +1,35 @@
+import logging
+
 import torch
 from torchvision import transforms, models
 from torch import nn
 
-# === Reconstruct model ===
-model = models.resnet18(pretrained=False)
-model.fc = nn.Linear(model.fc.in_features, 1)
+from batching import MicroBatcher
+from config import BINARY_WEIGHTS, TOOTH_PROB_THRESHOLD, CLASSIFIER_BATCH_SIZE, SCHEDULER_ENABLED, SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS, WARMUP_BATCH_SIZE
+from backends import load_classifier
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+def build_eager_model():
+    # === Reconstruct model ===
+    model = models.resnet18(pretrained=False)
+    model.fc = nn.Linear(model.fc.in_features, 1)
+
+    # === Load weights ===
+    state_dict = torch.load(BINARY_WEIGHTS, map_location='cpu')
+    model.load_state_dict(state_dict)
+    model.eval()  # eval + inference_mode forwards don't mutate the module, so threads share it
+    return model
+
+def _load_model():
+    return load_classifier("binary_classifier", build_eager_model)
 
-# === Load weights ===
-state_dict = torch.load('models/tooth_classification/binary_classifier/binary_tooth.pt', map_location='cpu')
-model.load_state_dict(state_dict)
-model.eval()
+def _warmup(model):
+    with torch.inference_mode():
+        model(torch.zeros(WARMUP_BATCH_SIZE, 3, 224, 224))
+
+registry.register("binary_classifier", _load_model, _warmup)
 
 # === Image transforms ===
 transform = transforms.Compose([
@@ -20,14 +40,33 @@ transform = transforms.Compose([
 ])
 
 # === Inference ===
-def binary_filter_teeth(crops):
+def _forward_probs(tensors):
+    """One forward pass over a list of preprocessed crops, returning tooth probabilities."""
+    model = registry.get("binary_classifier")
+    with torch.inference_mode():
+        logits = model(torch.stack(tensors))
+        return torch.sigmoid(logits).squeeze(1).tolist()
+
+# Shared across request threads: coalesces crops from concurrent requests
+scheduler = MicroBatcher(_forward_probs, SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS, name="binary-batcher")
+
+def predict_tooth_probs(crops, batch_size=CLASSIFIER_BATCH_SIZE):
+    tensors = [transform(crop) for crop in crops]
+    if SCHEDULER_ENABLED:
+        return scheduler.map(tensors)
+
+    probs = []
+    for start in range(0, len(tensors), batch_size):
+        probs.extend(_forward_probs(tensors[start:start + batch_size]))
+    return probs
+
+def binary_filter_teeth(crops, batch_size=CLASSIFIER_BATCH_SIZE):
     filtered = []
-    for idx, crop in enumerate(crops):
-        img_tensor = transform(crop).unsqueeze(0)
-        with torch.no_grad():
-            logit = model(img_tensor)
-            prob = torch.sigmoid(logit).item()
-            print(f"[DEBUG] Crop {idx}: prob = {prob:.4f}")
-            if prob >= 0.15: # Classify as tooth.
-                filtered.append((idx, crop))  # Keep index too
-    return filtered
\ No newline at end of file
+    probs = predict_tooth_probs(crops, batch_size)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for idx, (crop, prob) in enumerate(zip(crops, probs)):
+        if debug:
+            logger.debug("Crop %d: prob = %.4f", idx, prob)
+        if prob >= TOOTH_PROB_THRESHOLD: # Classify as tooth.
+            filtered.append((idx, crop))  # Keep index too
+    return filtered
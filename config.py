@@ -0,0 +1,130 @@
+import os
+
+# === Logging ===
+# DEBUG enables per-crop classifier output
+LOG_LEVEL = os.environ.get("DENTASSIST_LOG_LEVEL", "INFO").upper()
+
+# === Model weights ===
+DETECTOR_WEIGHTS = os.environ.get("DENTASSIST_DETECTOR_WEIGHTS", "models/tooth_classification/yolo_detector/yolo_detector.pt")
+BINARY_WEIGHTS = os.environ.get("DENTASSIST_BINARY_WEIGHTS", "models/tooth_classification/binary_classifier/binary_tooth.pt")
+DISEASE_WEIGHTS = os.environ.get("DENTASSIST_DISEASE_WEIGHTS", "models/disease_classification/multiclass_classifier.pt")
+
+# === Inference backends ===
+# Classifiers: "eager", "torchscript", "compile" (torch.compile), "onnx" (ONNX Runtime)
+# or "quantized" (INT8 weights from quantize_models.py)
+CLASSIFIER_BACKEND = os.environ.get("DENTASSIST_CLASSIFIER_BACKEND", "eager")
+# Detector: "pytorch", "torchscript" or "onnx"
+DETECTOR_BACKEND = os.environ.get("DENTASSIST_DETECTOR_BACKEND", "pytorch")
+# Where export_models.py writes exported models and the backends read them
+EXPORT_DIR = os.environ.get("DENTASSIST_EXPORT_DIR", "models/exported")
+# Quantized kernel backend; must match the one used when calibrating ("x86", "fbgemm" or "qnnpack" on ARM)
+QUANTIZATION_ENGINE = os.environ.get("DENTASSIST_QUANTIZATION_ENGINE", "x86")
+
+# === Pipeline thresholds ===
+# These change the analysis output, so they are part of the result cache key
+DETECTION_CONF = float(os.environ.get("DENTASSIST_DETECTION_CONF", 0.005))
+TOOTH_PROB_THRESHOLD = float(os.environ.get("DENTASSIST_TOOTH_PROB_THRESHOLD", 0.15))
+IOU_THRESHOLD = float(os.environ.get("DENTASSIST_IOU_THRESHOLD", 0.1))
+# Highest-confidence detections kept per image, and how far each crop extends past its box
+MAX_DETECTIONS = int(os.environ.get("DENTASSIST_MAX_DETECTIONS", 40))
+EXPANSION_RATIO = float(os.environ.get("DENTASSIST_EXPANSION_RATIO", 0.1))
+
+# === Large image detection ===
+# "full" runs YOLO on the full image; "downscale" and "tiled" apply to images whose
+# longest side exceeds DETECTION_LARGE_SIDE. Boxes are always mapped back to full resolution.
+DETECTION_MODE = os.environ.get("DENTASSIST_DETECTION_MODE", "full")
+DETECTION_LARGE_SIDE = int(os.environ.get("DENTASSIST_DETECTION_LARGE_SIDE", 2048))
+# YOLO input size for downscaled images and tiles
+DETECTION_IMGSZ = int(os.environ.get("DENTASSIST_DETECTION_IMGSZ", 1280))
+TILE_SIZE = int(os.environ.get("DENTASSIST_TILE_SIZE", 1280))
+TILE_OVERLAP = float(os.environ.get("DENTASSIST_TILE_OVERLAP", 0.2))
+# Boxes from different tiles are merged when their intersection covers this share of the smaller box
+TILE_MERGE_OVERLAP = float(os.environ.get("DENTASSIST_TILE_MERGE_OVERLAP", 0.6))
+
+# === Classifier inference ===
+# Number of crops stacked into a single ResNet18 forward pass.
+CLASSIFIER_BATCH_SIZE = int(os.environ.get("DENTASSIST_CLASSIFIER_BATCH_SIZE", 32))
+
+# === Cross-request micro-batching ===
+# Crops from concurrent requests are coalesced into one forward pass of up to
+# SCHEDULER_MAX_BATCH_SIZE, waiting at most SCHEDULER_MAX_WAIT_MS for more to arrive.
+SCHEDULER_ENABLED = os.environ.get("DENTASSIST_SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_MAX_BATCH_SIZE = int(os.environ.get("DENTASSIST_SCHEDULER_MAX_BATCH_SIZE", 32))
+SCHEDULER_MAX_WAIT_MS = float(os.environ.get("DENTASSIST_SCHEDULER_MAX_WAIT_MS", 5))
+
+# === Out-of-process inference ===
+# Number of worker processes that own the models. 0 keeps inference in the web process.
+INFERENCE_WORKERS = int(os.environ.get("DENTASSIST_INFERENCE_WORKERS", 0))
+# torch intra-op threads per worker, fixed so workers don't oversubscribe the cores
+WORKER_TORCH_THREADS = int(os.environ.get("DENTASSIST_WORKER_TORCH_THREADS", 1))
+# Pin each worker to its own block of WORKER_TORCH_THREADS cores (Linux only)
+WORKER_PIN_CPUS = os.environ.get("DENTASSIST_WORKER_PIN_CPUS", "0") == "1"
+WORKER_TASK_TIMEOUT_S = float(os.environ.get("DENTASSIST_WORKER_TASK_TIMEOUT_S", 120))
+
+# === Asynchronous analysis jobs ===
+JOB_WORKERS = int(os.environ.get("DENTASSIST_JOB_WORKERS", 2))
+# Jobs queued or running at once; submissions beyond this are rejected with 503
+JOB_MAX_PENDING = int(os.environ.get("DENTASSIST_JOB_MAX_PENDING", 32))
+# How long finished job results are kept for polling
+JOB_RESULT_TTL_S = float(os.environ.get("DENTASSIST_JOB_RESULT_TTL_S", 600))
+
+# === Background artifact writes ===
+PERSIST_WORKERS = int(os.environ.get("DENTASSIST_PERSIST_WORKERS", 2))
+# Writes queued beyond this run in the request thread instead, bounding the memory
+# held by uploads and crops waiting to be saved
+PERSIST_MAX_PENDING = int(os.environ.get("DENTASSIST_PERSIST_MAX_PENDING", 16))
+
+# === Compact /analyze responses ===
+# Longest side, in pixels, of the per-tooth crop thumbnails
+COMPACT_THUMBNAIL_SIZE = int(os.environ.get("DENTASSIST_COMPACT_THUMBNAIL_SIZE", 128))
+
+# === Multi-image /analyze_batch ===
+BATCH_MAX_IMAGES = int(os.environ.get("DENTASSIST_BATCH_MAX_IMAGES", 32))
+# Limit on the uncompressed size of an uploaded zip archive
+BATCH_MAX_ARCHIVE_BYTES = int(os.environ.get("DENTASSIST_BATCH_MAX_ARCHIVE_BYTES", 512 * 1024 * 1024))
+
+# === Analysis result cache ===
+RESULT_CACHE_ENABLED = os.environ.get("DENTASSIST_RESULT_CACHE_ENABLED", "1") == "1"
+# In-memory LRU tier, bounded by the size of the serialized responses
+RESULT_CACHE_MEMORY_MAX_BYTES = int(os.environ.get("DENTASSIST_RESULT_CACHE_MEMORY_MAX_BYTES", 256 * 1024 * 1024))
+# Optional on-disk tier; empty disables it
+RESULT_CACHE_DIR = os.environ.get("DENTASSIST_RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("DENTASSIST_RESULT_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# === Stored analyses for report generation by ID ===
+ANALYSIS_STORE_MAX_ENTRIES = int(os.environ.get("DENTASSIST_ANALYSIS_STORE_MAX_ENTRIES", 32))
+ANALYSIS_STORE_TTL_S = float(os.environ.get("DENTASSIST_ANALYSIS_STORE_TTL_S", 3600))
+
+# === PDF report rendering ===
+# Worker processes rendering reports outside the web process
+REPORT_WORKERS = int(os.environ.get("DENTASSIST_REPORT_WORKERS", 2))
+# Browser cache lifetime for downloaded reports (reports never change once rendered)
+REPORT_CACHE_MAX_AGE_S = int(os.environ.get("DENTASSIST_REPORT_CACHE_MAX_AGE_S", 3600))
+
+# === Artifact storage (uploads, stored X-rays, crops, reports) ===
+# Retention shared by all artifact directories: files older than the age limit are
+# deleted, then the oldest files until the total is under the byte limit. 0 disables a limit.
+STORAGE_MAX_AGE_S = float(os.environ.get("DENTASSIST_STORAGE_MAX_AGE_S", 0))
+STORAGE_MAX_BYTES = int(os.environ.get("DENTASSIST_STORAGE_MAX_BYTES", 0))
+STORAGE_CLEANUP_INTERVAL_S = float(os.environ.get("DENTASSIST_STORAGE_CLEANUP_INTERVAL_S", 300))
+# Levels of two-hex-character subdirectories below each artifact directory
+STORAGE_SHARD_DEPTH = int(os.environ.get("DENTASSIST_STORAGE_SHARD_DEPTH", 2))
+
+# === Model loading and warmup ===
+# "background": load and warm models in a thread at startup; "eager": before serving;
+# "lazy": on the first request that needs them
+MODEL_PRELOAD = os.environ.get("DENTASSIST_MODEL_PRELOAD", "background")
+WARMUP_ENABLED = os.environ.get("DENTASSIST_WARMUP_ENABLED", "1") == "1"
+WARMUP_RUNS = int(os.environ.get("DENTASSIST_WARMUP_RUNS", 1))
+# Side of the dummy image used to warm up the detector
+WARMUP_IMAGE_SIZE = int(os.environ.get("DENTASSIST_WARMUP_IMAGE_SIZE", 640))
+# Dummy batch size used to warm up the classifiers
+WARMUP_BATCH_SIZE = int(os.environ.get("DENTASSIST_WARMUP_BATCH_SIZE", 8))
+
+# === On-demand request profiling ===
+# Comma-separated tokens; a request sending one in the X-Profile header or ?profile=
+# is run under cProfile and torch.profiler. Empty disables profiling.
+PROFILING_TOKENS = frozenset(t for t in os.environ.get("DENTASSIST_PROFILING_TOKENS", "").split(",") if t)
+PROFILE_DIR = os.environ.get("DENTASSIST_PROFILE_DIR", "profiles")
+# Only the newest traces are kept
+PROFILE_MAX_TRACES = int(os.environ.get("DENTASSIST_PROFILE_MAX_TRACES", 20))
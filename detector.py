@@ -1,44 +1,167 @@
 from ultralytics import YOLO
-from PIL import Image
+import numpy as np
 import torch
 import os
+import threading
+from PIL import Image
+
+from backends import detector_weights_path
+from bb_filering import overlap_matrix, suppress_indices
+from config import (
+    DETECTION_CONF, EXPANSION_RATIO, MAX_DETECTIONS, WARMUP_IMAGE_SIZE,
+    DETECTION_MODE, DETECTION_LARGE_SIDE, DETECTION_IMGSZ, TILE_SIZE, TILE_OVERLAP, TILE_MERGE_OVERLAP,
+)
+from model_registry import registry
+from utils.image_processing import load_rgb
+
+DETECTION_MODES = ("full", "downscale", "tiled")
+
+# The ultralytics predictor keeps per-call state, so concurrent requests take turns on it
+model_lock = threading.Lock()
+
+# === YOLOv8 model, loaded through the registry ===
+def _load_model():
+    # Exported .torchscript/.onnx files run through the same ultralytics wrapper
+    return YOLO(detector_weights_path(), task="detect")
+
+def _warmup(model):
+    dummy = np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+    with model_lock:
+        model(dummy, conf=DETECTION_CONF, verbose=False)
+
+registry.register("detector", _load_model, _warmup)
+
+def expand_boxes(xyxy, width, height, ratio=EXPANSION_RATIO):
+    """Grow N x 4 xyxy boxes by ratio of their size on each side, clipped to the image, as int pixel bounds."""
+    wh = xyxy[:, 2:] - xyxy[:, :2]
+    expanded = np.concatenate([xyxy[:, :2] - ratio * wh, xyxy[:, 2:] + ratio * wh], axis=1)
+    return np.clip(expanded, 0, [width, height, width, height]).astype(int)
+
+def tile_origins(length, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Start offsets of overlapping tiles covering [0, length); the last tile ends at the edge."""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    origins = list(range(0, length - tile, stride))
+    return origins + [length - tile]
+
+def _detect_full(model, img):
+    pixels = np.asarray(img)  # crops are slices of this one array
+    with model_lock:
+        # ultralytics expects BGR arrays; this is the same flip it applies to PIL input
+        boxes = model(np.ascontiguousarray(pixels[..., ::-1]), conf=DETECTION_CONF)[0].boxes  # get the first result
+    return boxes.xyxy, boxes.conf, pixels
 
-# Load YOLOv8 model
-model = YOLO('models/tooth_classification/yolo_detector/yolo_detector.pt')  # adjust to your model path
+def _detect_downscaled(model, img):
+    # reduce() averages factor x factor blocks like JPEG draft decoding, without a second decode
+    factor = -(-max(img.size) // DETECTION_LARGE_SIDE)
+    small = img.reduce(factor)
+    with model_lock:
+        boxes = model(small, conf=DETECTION_CONF, imgsz=DETECTION_IMGSZ)[0].boxes
+    scale = torch.tensor([img.width / small.width, img.height / small.height] * 2, device=boxes.xyxy.device)
+    return boxes.xyxy * scale, boxes.conf
 
-def detect_and_crop(image_path):
-    results = model(image_path, conf=0.005)[0]  # get the first result
-    img = Image.open(image_path).convert("RGB")
+def _detect_tiled(model, img):
+    origins = [(x, y) for y in tile_origins(img.height) for x in tile_origins(img.width)]
+    tiles = [img.crop((x, y, min(x + TILE_SIZE, img.width), min(y + TILE_SIZE, img.height))) for x, y in origins]
+    with model_lock:
+        results = model(tiles, conf=DETECTION_CONF, imgsz=DETECTION_IMGSZ)
+
+    # Keep each tile's top boxes by confidence (the low detection threshold returns many),
+    # shifted to full-image coordinates
+    xyxy, conf, tile_ids = [], [], []
+    for tile_id, (r, (x, y)) in enumerate(zip(results, origins)):
+        top = r.boxes.conf.topk(min(MAX_DETECTIONS, len(r.boxes.conf))).indices
+        xyxy.append(r.boxes.xyxy[top] + r.boxes.xyxy.new_tensor([x, y, x, y]))
+        conf.append(r.boxes.conf[top])
+        tile_ids.append(np.full(len(top), tile_id))
+    xyxy, conf, tile_ids = torch.cat(xyxy), torch.cat(conf), np.concatenate(tile_ids)
+
+    # Merge duplicates along the seams: a tooth cut by a tile edge is a partial box inside
+    # the neighbour's full box. Only boxes reaching into another tile can have such a
+    # duplicate; boxes from the same tile were already NMS'd by YOLO.
+    boxes = xyxy.cpu().numpy().astype(np.float64)
+    scores = conf.cpu().numpy()
+    rects = np.array([(x, y, x + tile.width, y + tile.height) for (x, y), tile in zip(origins, tiles)])
+    in_tile = (
+        (boxes[:, None, 0] < rects[None, :, 2]) & (boxes[:, None, 2] > rects[None, :, 0])
+        & (boxes[:, None, 1] < rects[None, :, 3]) & (boxes[:, None, 3] > rects[None, :, 1])
+    )
+    in_tile[np.arange(len(boxes)), tile_ids] = False
+    seam = np.flatnonzero(in_tile.any(axis=1))
+
+    overlaps = overlap_matrix(boxes[seam])
+    overlaps[tile_ids[seam][:, None] == tile_ids[seam][None, :]] = 0
+    dropped = np.setdiff1d(seam, seam[suppress_indices(boxes[seam], overlaps, TILE_MERGE_OVERLAP, scores[seam])])
+    keep = np.setdiff1d(np.arange(len(boxes)), dropped)
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+    keep = torch.as_tensor(keep, dtype=torch.long, device=xyxy.device)
+    return xyxy[keep], conf[keep]
+
+def _is_large(img):
+    return DETECTION_MODE != "full" and max(img.size) > DETECTION_LARGE_SIDE
+
+def detect_boxes(img):
+    """
+    Detect on an RGB image, returning (xyxy, conf) tensors in full-resolution coordinates
+    and the image as an array when it was needed anyway (full mode), else None.
+    """
+    model = registry.get("detector")
+    if not _is_large(img):
+        return _detect_full(model, img)
+    if DETECTION_MODE == "downscale":
+        return (*_detect_downscaled(model, img), None)
+    if DETECTION_MODE == "tiled":
+        return (*_detect_tiled(model, img), None)
+    raise ValueError(f"Unknown detection mode '{DETECTION_MODE}', expected one of {DETECTION_MODES}")
+
+def crop_detections(img, xyxy, conf, pixels=None):
+    """Keep the top boxes by confidence and cut their expanded crops. Returns (crops, boxes_info)."""
     img_width, img_height = img.size
-    crops = []
-    boxes_info = []  # Store box coordinates
-
-    # Get top 40 boxes sorted by confidence
-    boxes = results.boxes
-    confs = boxes.conf.cpu().numpy()
-    sorted_indices = confs.argsort()[::-1][:40]
-
-    for idx in sorted_indices:
-        x1, y1, x2, y2 = boxes.xyxy[idx].cpu().numpy()
-        w = x2 - x1
-        h = y2 - y1
-
-        expansion_ratio = 0.1
-        x1_exp = max(0, x1 - expansion_ratio * w)
-        y1_exp = max(0, y1 - expansion_ratio * h)
-        x2_exp = min(img_width, x2 + expansion_ratio * w)
-        y2_exp = min(img_height, y2 + expansion_ratio * h)
-
-        # Store original (non-expanded) box coordinates
-        boxes_info.append({
-            'x1': int(x1),
-            'y1': int(y1),
-            'x2': int(x2),
-            'y2': int(y2)
-        })
-
-        # Crop and append
-        crop = img.crop((int(x1_exp), int(y1_exp), int(x2_exp), int(y2_exp)))
-        crops.append(crop)
 
+    # Top boxes by confidence, moved to the host in one transfer
+    top = conf.topk(min(MAX_DETECTIONS, len(conf))).indices
+    xyxy = xyxy[top].cpu().numpy()
+
+    # Store original (non-expanded) box coordinates
+    boxes_info = [
+        {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+        for x1, y1, x2, y2 in xyxy.astype(int).tolist()
+    ]
+    bounds = expand_boxes(xyxy, img_width, img_height).tolist()
+    if pixels is not None:
+        crops = [Image.fromarray(pixels[y1:y2, x1:x2]) for x1, y1, x2, y2 in bounds]
+    else:
+        # Large images: crop straight from the decoded image instead of copying it into an array
+        crops = [img.crop(tuple(b)) for b in bounds]
     return crops, boxes_info
+
+def detect_and_crop(image):
+    # Accept a path or an already decoded image so callers can decode once
+    img = load_rgb(image)
+    return crop_detections(img, *detect_boxes(img))
+
+def detect_and_crop_batch(images):
+    """
+    detect_and_crop for many images. Images of the same size go through YOLO in one call;
+    grouping by size keeps the letterboxing, and so the boxes, identical to single-image calls.
+    Returns a list of (crops, boxes_info) in input order.
+    """
+    imgs = [load_rgb(image) for image in images]
+    model = registry.get("detector")
+    outputs = [None] * len(imgs)
+
+    groups = {}
+    for idx, img in enumerate(imgs):
+        if _is_large(img):
+            outputs[idx] = crop_detections(img, *detect_boxes(img))
+        else:
+            groups.setdefault(img.size, []).append(idx)
+
+    for indices in groups.values():
+        pixels = [np.asarray(imgs[idx]) for idx in indices]
+        with model_lock:
+            results = model([np.ascontiguousarray(p[..., ::-1]) for p in pixels], conf=DETECTION_CONF)
+        for idx, p, result in zip(indices, pixels, results):
+            outputs[idx] = crop_detections(imgs[idx], result.boxes.xyxy, result.boxes.conf, p)
+    return outputs
@@ -3,6 +3,11 @@ from torchvision import transforms, models
 from torch import nn
 from PIL import Image
 
+from batching import MicroBatcher
+from config import DISEASE_WEIGHTS, CLASSIFIER_BATCH_SIZE, SCHEDULER_ENABLED, SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS, WARMUP_BATCH_SIZE
+from backends import load_classifier
+from model_registry import registry
+
 # === Class Names ===
 class_names = [
     "Caries",
@@ -14,14 +19,25 @@ class_names = [
     "Deeper Caries"
 ]
 
-# === Model Definition ===
-model = models.resnet18(weights=None)  # or "IMAGENET1K_V1" if you want pretrained
-model.fc = nn.Linear(model.fc.in_features, len(class_names))  # 7 outputs
+def build_eager_model():
+    # === Model Definition ===
+    model = models.resnet18(weights=None)  # or "IMAGENET1K_V1" if you want pretrained
+    model.fc = nn.Linear(model.fc.in_features, len(class_names))  # 7 outputs
+
+    # === Load state dict ===
+    state_dict = torch.load(DISEASE_WEIGHTS, map_location="cpu")
+    model.load_state_dict(state_dict)
+    model.eval()  # eval + inference_mode forwards don't mutate the module, so threads share it
+    return model
+
+def _load_model():
+    return load_classifier("disease_classifier", build_eager_model)
+
+def _warmup(model):
+    with torch.inference_mode():
+        model(torch.zeros(WARMUP_BATCH_SIZE, 3, 224, 224))
 
-# === Load state dict ===
-state_dict = torch.load("models/disease_classification/multiclass_classifier.pt", map_location="cpu")
-model.load_state_dict(state_dict)
-model.eval()
+registry.register("disease_classifier", _load_model, _warmup)
 
 # === Image transforms ===
 transform = transforms.Compose([
@@ -29,8 +45,21 @@ transform = transforms.Compose([
     transforms.ToTensor(),
 ])
 
+# === Batched forward pass ===
+def _forward_predictions(tensors):
+    """One forward pass over a list of preprocessed crops, returning (class index, confidence) pairs."""
+    model = registry.get("disease_classifier")
+    with torch.inference_mode():
+        output = model(torch.stack(tensors))
+        pred_classes = output.argmax(dim=1)
+        confidences = torch.softmax(output, dim=1).gather(1, pred_classes.unsqueeze(1)).squeeze(1)
+    return list(zip(pred_classes.tolist(), confidences.tolist()))
+
+# Shared across request threads: coalesces crops from concurrent requests
+scheduler = MicroBatcher(_forward_predictions, SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS, name="disease-batcher")
+
 # === Run classification on list of cropped PIL Images ===
-def classify_teeth(input_data):
+def classify_teeth(input_data, batch_size=CLASSIFIER_BATCH_SIZE):
     predictions = []
     
     # Handle both single image and list of images
@@ -44,18 +73,20 @@ def classify_teeth(input_data):
     else:
         raise TypeError(f"Unexpected input type: {type(input_data)}")
 
-    for idx, img in enumerate(images):
-        img_tensor = transform(img).unsqueeze(0)
-        with torch.no_grad():
-            output = model(img_tensor)
-            pred_class = output.argmax(dim=1).item()
-            confidence = torch.softmax(output, dim=1)[0][pred_class].item()
-
-            predictions.append({
-                "id": idx,
-                "disease": class_names[pred_class],
-                "confidence": round(confidence, 4),
-            })
+    tensors = [transform(img) for img in images]
+    if SCHEDULER_ENABLED:
+        outputs = scheduler.map(tensors)
+    else:
+        outputs = []
+        for start in range(0, len(tensors), batch_size):
+            outputs.extend(_forward_predictions(tensors[start:start + batch_size]))
+
+    for idx, (pred_class, confidence) in enumerate(outputs):
+        predictions.append({
+            "id": idx,
+            "disease": class_names[pred_class],
+            "confidence": round(confidence, 4),
+        })
 
     # If single image was passed, return just the first prediction
     if isinstance(input_data, (str, Image.Image)):
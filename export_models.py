@@ -0,0 +1,128 @@
+"""
+Export the detector and classifiers for the torchscript/onnx backends and check
+that the exported models match eager PyTorch.
+
+    python export_models.py --format onnx
+    python export_models.py --format torchscript --models binary_classifier --verify-only
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import numpy as np
+import torch
+
+from backends import EXPORT_SUFFIXES, exported_path, load_classifier
+from config import DETECTOR_WEIGHTS, DETECTION_CONF, EXPORT_DIR
+
+CLASSIFIERS = ("binary_classifier", "disease_classifier")
+MODELS = CLASSIFIERS + ("detector",)
+
+
+def _eager_builder(name):
+    if name == "binary_classifier":
+        from binary_classifier import build_eager_model
+    else:
+        from disease_classifier import build_eager_model
+    return build_eager_model
+
+
+# === Export ===
+# The dynamo-based exporter emits opset 18; asking for an older one fails its downconversion
+ONNX_OPSET = 18
+
+
+def export_model(model, path, fmt):
+    """Export an eager classifier (N x 3 x 224 x 224 in, logits out) to path."""
+    dummy = torch.randn(2, 3, 224, 224)
+    if fmt == "torchscript":
+        with torch.inference_mode():
+            traced = torch.jit.freeze(torch.jit.trace(model, dummy))
+        traced.save(path)
+    else:
+        torch.onnx.export(
+            model, dummy, path,
+            input_names=["input"], output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+        )
+    return path
+
+
+def export_classifier(name, fmt):
+    return export_model(_eager_builder(name)(), exported_path(name, fmt), fmt)
+
+
+def export_detector(fmt, imgsz):
+    from ultralytics import YOLO
+    # ultralytics writes the export next to the weights; move it into EXPORT_DIR
+    written = YOLO(DETECTOR_WEIGHTS).export(format=fmt, imgsz=imgsz, dynamic=(fmt == "onnx"))
+    path = exported_path("detector", fmt)
+    shutil.move(written, path)
+    return path
+
+
+# === Parity checks ===
+def verify_classifier(name, fmt, atol):
+    eager = _eager_builder(name)()
+    exported = load_classifier(name, None, backend=fmt)
+
+    worst = 0.0
+    torch.manual_seed(0)
+    for batch_size in (1, 7):
+        batch = torch.randn(batch_size, 3, 224, 224)
+        with torch.inference_mode():
+            expected = eager(batch)
+            actual = exported(batch)
+        worst = max(worst, (expected - actual).abs().max().item())
+    return worst <= atol, f"max |logit diff| = {worst:.2e} (atol {atol:.0e})"
+
+
+def verify_detector(fmt, imgsz, box_atol):
+    from ultralytics import YOLO
+
+    rng = np.random.default_rng(0)
+    image = (rng.random((imgsz // 2, imgsz, 3)) * 255).astype(np.uint8)
+    eager = YOLO(DETECTOR_WEIGHTS)(image, conf=DETECTION_CONF, verbose=False)[0].boxes
+    actual = YOLO(exported_path("detector", fmt), task="detect")(image, conf=DETECTION_CONF, verbose=False)[0].boxes
+
+    # Compare the top boxes by confidence; the exact tail near the threshold may differ
+    k = min(len(eager), len(actual), 40)
+    if k == 0:
+        return len(eager) == len(actual), f"{len(eager)} vs {len(actual)} boxes"
+    eager_top = eager.xyxy[eager.conf.argsort(descending=True)[:k]].cpu().numpy()
+    actual_top = actual.xyxy[actual.conf.argsort(descending=True)[:k]].cpu().numpy()
+    worst = float(np.abs(eager_top - actual_top).max())
+    return worst <= box_atol, f"top-{k} boxes max |coord diff| = {worst:.3f}px (atol {box_atol})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=sorted(EXPORT_SUFFIXES), required=True)
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=list(MODELS))
+    parser.add_argument("--imgsz", type=int, default=640, help="Detector export input size")
+    parser.add_argument("--atol", type=float, default=1e-4, help="Classifier logit tolerance")
+    parser.add_argument("--box-atol", type=float, default=1.0, help="Detector box tolerance in pixels")
+    parser.add_argument("--verify-only", action="store_true", help="Skip exporting, only run the parity checks")
+    args = parser.parse_args(argv)
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    failed = False
+    for name in args.models:
+        if not args.verify_only:
+            path = export_detector(args.format, args.imgsz) if name == "detector" else export_classifier(name, args.format)
+            print(f"[INFO] Exported {name} to {path}")
+
+        if name == "detector":
+            ok, detail = verify_detector(args.format, args.imgsz, args.box_atol)
+        else:
+            ok, detail = verify_classifier(name, args.format, args.atol)
+        print(f"[{'OK' if ok else 'FAIL'}] {name} {args.format} parity: {detail}")
+        failed |= not ok
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
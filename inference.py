@@ -0,0 +1,107 @@
+import threading
+
+from config import INFERENCE_WORKERS, WORKER_TORCH_THREADS, WORKER_PIN_CPUS, WORKER_TASK_TIMEOUT_S, MODEL_PRELOAD
+
+# Models are only imported in this process when inference runs in-process,
+# so in worker mode the web process never loads them.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Start the inference worker pool on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from worker_pool import InferenceWorkerPool
+                _pool = InferenceWorkerPool(
+                    INFERENCE_WORKERS,
+                    threads_per_worker=WORKER_TORCH_THREADS,
+                    pin_cpus=WORKER_PIN_CPUS,
+                    task_timeout=WORKER_TASK_TIMEOUT_S,
+                )
+    return _pool
+
+
+def _load_in_process():
+    import pipeline  # Registers the detector and classifiers with the registry
+    from model_registry import registry
+    registry.load_all()
+
+
+def start_model_loading():
+    """Start loading and warming models according to MODEL_PRELOAD."""
+    if INFERENCE_WORKERS > 0:
+        # Workers load and warm their models as soon as they start
+        if MODEL_PRELOAD != "lazy":
+            get_worker_pool()
+    elif MODEL_PRELOAD == "eager":
+        _load_in_process()
+    elif MODEL_PRELOAD == "background":
+        threading.Thread(target=_load_in_process, name="model-loader", daemon=True).start()
+
+
+def readiness():
+    """
+    Return (ready, details): ready once every model is loaded and warmed up. In lazy
+    mode models only load on the first request, which a load balancer gated on /readyz
+    would never send, so ready means configured: loaders registered and none failed.
+    """
+    if INFERENCE_WORKERS > 0:
+        if _pool is None:
+            return MODEL_PRELOAD == "lazy", {"workers": {}, "preload": MODEL_PRELOAD}
+        return _pool.is_ready(), {"workers": dict(_pool.worker_status), "preload": MODEL_PRELOAD}
+
+    import pipeline  # noqa: F401  Registers the loaders
+    from model_registry import registry
+    ready = registry.is_configured() if MODEL_PRELOAD == "lazy" else registry.is_ready()
+    return ready, {"models": registry.status(), "preload": MODEL_PRELOAD}
+
+
+def _run(fn_name, *args, image=None):
+    if INFERENCE_WORKERS > 0:
+        return get_worker_pool().run(fn_name, *args, image=image)
+
+    import pipeline
+    if image is not None:
+        args = (image,) + args
+    return getattr(pipeline, fn_name)(*args)
+
+
+def analyze_image(image):
+    """Detection, filtering and classification. Returns (boxes, crops, predictions)."""
+    return _run("analyze_image", image=image)
+
+
+def analyze_images(images):
+    """
+    analyze_image for a series. In-process, crops from all images share classifier
+    batches; with workers, the images are spread across the worker processes.
+    """
+    if INFERENCE_WORKERS > 0:
+        pool = get_worker_pool()
+        futures = [pool.submit("analyze_image", image=image) for image in images]
+        return [pool.wait(future) for future in futures]
+
+    import pipeline
+    return pipeline.analyze_images(images)
+
+
+def detect_teeth(image):
+    """Detection and filtering only. Returns (boxes, crops)."""
+    return _run("detect_teeth", image=image)
+
+
+def classify_detected(boxes, crops):
+    """Classify filtered crops and tag each box with its disease. Returns predictions."""
+    predictions = _run("classify_detected", boxes, crops)
+    # Tags applied inside a worker process don't travel back, so apply them here
+    for box, pred in zip(boxes, predictions):
+        box['disease'] = pred['disease']
+    return predictions
+
+
+def classify_single(image):
+    """Classify one already cropped tooth image."""
+    return _run("classify_teeth", image=image)
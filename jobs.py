@@ -0,0 +1,128 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when the job executor already has its maximum number of pending jobs."""
+
+
+class Job:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def status_dict(self):
+        status = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+
+class JobManager:
+    """
+    Runs functions on a bounded background executor and keeps their results
+    for result_ttl seconds after they finish.
+    """
+
+    def __init__(self, max_workers=2, max_pending=32, result_ttl=600, name="analysis-job"):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return its job ID."""
+        with self._lock:
+            self._expire_locked()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs ({self.max_pending}), try again later")
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.job_id] = job
+            self._pending += 1
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.job_id
+
+    def get(self, job_id):
+        """Return the Job, or None if it is unknown or its result has expired."""
+        with self._lock:
+            self._expire_locked()
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = JOB_RUNNING
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = JOB_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def _expire_locked(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class BoundedExecutor:
+    """
+    Thread pool for fire-and-forget work with at most max_pending queued or running
+    tasks. When it is full, submit runs the task in the calling thread instead, so a
+    backlog applies backpressure rather than holding ever more task arguments in memory.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, name="bounded"):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs), or run it now if max_pending tasks are already queued."""
+        if not self._slots.acquire(blocking=False):
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"[ERROR] Inline background task failed: {e}")
+            return None
+        try:
+            return self._executor.submit(self._run, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, fn, args, kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            print(f"[ERROR] Background task failed: {e}")
+        finally:
+            self._slots.release()
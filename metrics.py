@@ -0,0 +1,203 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; covers a cached hit up to a slow full analysis on CPU
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, key + (repr(bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "dentassist_stage_duration_seconds", "Time spent in each analysis stage", ("stage",)
+)
+request_seconds = registry.histogram(
+    "dentassist_request_duration_seconds", "Time spent handling each request", ("endpoint",)
+)
+filter_crops = registry.counter(
+    "dentassist_filter_crops_total", "Crops entering and leaving each filter stage", ("stage", "direction")
+)
+
+
+# === Recording ===
+# Events recorded while a recorder is active, so a request can report its own stage
+# timings and inference worker processes can send theirs back to the web process.
+_recorder = ContextVar("metrics_recorder", default=None)
+
+
+def _apply(event):
+    kind, stage, *values = event
+    if kind == "stage":
+        stage_seconds.observe(values[0], stage=stage)
+    else:
+        filter_crops.inc(values[0], stage=stage, direction="in")
+        filter_crops.inc(values[1], stage=stage, direction="out")
+
+    events = _recorder.get()
+    if events is not None:
+        events.append(event)
+
+
+def start_recording():
+    """Start collecting events in the current context. Returns (token, events)."""
+    events = []
+    return _recorder.set(events), events
+
+
+def stop_recording(token):
+    _recorder.reset(token)
+
+
+@contextmanager
+def recording():
+    """Collect the events recorded inside the block into the yielded list."""
+    token, events = start_recording()
+    try:
+        yield events
+    finally:
+        stop_recording(token)
+
+
+def replay(events):
+    """Apply events recorded elsewhere (e.g. in a worker process) as if recorded here."""
+    for event in events:
+        _apply(event)
+
+
+def record_stage(name, seconds):
+    _apply(("stage", name, seconds))
+
+
+def count_crops(stage, crops_in, crops_out):
+    _apply(("crops", stage, crops_in, crops_out))
+
+
+@contextmanager
+def stage(name):
+    """Time the block with a monotonic clock and record it as one observation of the stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+class StageTimer:
+    """
+    Accumulates time over several blocks (e.g. one per tooth) and records it as a
+    single observation, so a request contributes one sample per stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self._start
+
+    def record(self):
+        record_stage(self.name, self.seconds)
+
+
+def server_timing(events, total_seconds=None):
+    """Server-Timing header value: stage durations in milliseconds, summed per stage name."""
+    durations = {}
+    for kind, stage, *values in events:
+        if kind == "stage":
+            durations[stage] = durations.get(stage, 0.0) + values[0]
+    if total_seconds is not None:
+        durations["total"] = total_seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
@@ -0,0 +1,120 @@
+import threading
+import time
+
+from config import WARMUP_ENABLED, WARMUP_RUNS
+
+
+class _Entry:
+    def __init__(self, loader, warmup):
+        self.loader = loader
+        self.warmup = warmup
+        self.model = None
+        self.warm = False
+        self.load_s = None
+        self.warmup_s = None
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Loads models on first use (or ahead of time via load_all) instead of at
+    import, optionally runs warmup inferences so the first real request never
+    hits cold kernels, and records load/warmup timings for /readyz.
+    """
+
+    def __init__(self, warmup_enabled=True, warmup_runs=1):
+        self.warmup_enabled = warmup_enabled
+        self.warmup_runs = warmup_runs
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None):
+        """Register a zero-argument loader and an optional warmup(model) callable."""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(loader, warmup)
+
+    def override(self, name, model):
+        """Install an already built model (stub weights for benchmarks, tests)."""
+        with self._lock:
+            entry = self._entries.setdefault(name, _Entry(None, None))
+        with entry.lock:
+            entry.model = model
+            entry.warm = True
+            entry.error = None
+
+    def get(self, name):
+        """Return the model, loading and warming it first if needed."""
+        entry = self._entries[name]
+        if entry.model is None or (self.warmup_enabled and not entry.warm):
+            self._ensure_ready(name, entry)
+        return entry.model
+
+    def load_all(self):
+        """Load and warm every registered model. Errors are recorded, not raised."""
+        for name, entry in list(self._entries.items()):
+            try:
+                self._ensure_ready(name, entry)
+            except Exception:
+                pass
+
+    def start_background_load(self):
+        thread = threading.Thread(target=self.load_all, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        entries = list(self._entries.values())
+        return bool(entries) and all(
+            entry.model is not None and (entry.warm or not self.warmup_enabled)
+            for entry in entries
+        )
+
+    def is_configured(self):
+        """True once loaders are registered and none has failed; nothing needs to be loaded yet."""
+        entries = list(self._entries.values())
+        return bool(entries) and all(entry.error is None for entry in entries)
+
+    def status(self):
+        return {
+            name: {
+                "loaded": entry.model is not None,
+                "warm": entry.warm,
+                "load_s": entry.load_s,
+                "warmup_s": entry.warmup_s,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def _ensure_ready(self, name, entry):
+        with entry.lock:
+            if entry.model is None:
+                start = time.monotonic()
+                try:
+                    entry.model = entry.loader()
+                except Exception as e:
+                    entry.error = f"load failed: {e}"
+                    raise
+                entry.load_s = round(time.monotonic() - start, 4)
+                entry.error = None  # An earlier attempt may have failed
+                print(f"[INFO] Loaded model '{name}' in {entry.load_s:.2f}s")
+
+            if self.warmup_enabled and not entry.warm:
+                start = time.monotonic()
+                try:
+                    if entry.warmup is not None:
+                        for _ in range(self.warmup_runs):
+                            entry.warmup(entry.model)
+                except Exception as e:
+                    entry.error = f"warmup failed: {e}"
+                    raise
+                entry.warm = True
+                entry.error = None
+                entry.warmup_s = round(time.monotonic() - start, 4)
+                print(f"[INFO] Warmed up model '{name}' in {entry.warmup_s:.2f}s")
+
+
+# Shared by the model modules, which register their loaders at import
+registry = ModelRegistry(WARMUP_ENABLED, WARMUP_RUNS)
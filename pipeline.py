@@ -0,0 +1,108 @@
+from detector import detect_and_crop, detect_and_crop_batch
+from binary_classifier import binary_filter_teeth
+from disease_classifier import classify_teeth
+from config import IOU_THRESHOLD
+from bb_filering import bounding_box_filter_iou, bounding_box_filter_center, hybrid_filter
+from metrics import stage, count_crops
+
+
+def detect_teeth(image):
+    """Run detection and filtering on a decoded image. Returns (boxes, crops)."""
+    # Step 1: YOLO detection
+    with stage("detection"):
+        initial_crops, boxes_info = detect_and_crop(image)
+
+    # Step 2: Binary classifier filtering
+    with stage("binary_filter"):
+        filtered = binary_filter_teeth(initial_crops)
+    count_crops("binary_filter", len(initial_crops), len(filtered))
+    filtered_indices = [idx for idx, _ in filtered]
+    filtered_crops = [crop for _, crop in filtered]
+    filtered_boxes = [boxes_info[i] for i in filtered_indices]
+
+    # Step 3: Bounding box filtering: 3 different options
+    # Option A: IOU only
+    with stage("box_filter"):
+        filtered_boxes, filtered_crops = bounding_box_filter_iou(filtered_boxes, filtered_crops, IOU_THRESHOLD)
+    count_crops("box_filter", len(filtered), len(filtered_crops))
+
+    # Option B: Midpoint only
+    # filtered_boxes, filtered_crops = bounding_box_filter_center(filtered_boxes, filtered_crops)
+
+    # Option C: Hybrid
+    # filtered_boxes, filtered_crops = hybrid_filter(filtered_boxes, filtered_crops)
+    # print("[DEBUG] After bounding box filtering")
+
+    return filtered_boxes, filtered_crops
+
+
+def classify_detected(boxes, crops):
+    """Classify filtered crops and tag each box with its disease for color coding."""
+    # Step 4: Multiclass disease classification
+    with stage("classification"):
+        predictions = classify_teeth(crops)
+    # print("[DEBUG] After classify_teeth")
+
+    # Step 5: Add disease classifications to bounding boxes for color coding
+    for i, pred in enumerate(predictions):
+        boxes[i]['disease'] = pred['disease']
+
+    return predictions
+
+
+def analyze_image(image):
+    """Full analysis of a decoded X-ray. Returns (boxes, crops, predictions)."""
+    boxes, crops = detect_teeth(image)
+    predictions = classify_detected(boxes, crops)
+    return boxes, crops, predictions
+
+
+# === Multi-image series ===
+def detect_teeth_batch(images):
+    """detect_teeth for many images, with one pooled binary filter pass. Returns [(boxes, crops)]."""
+    with stage("detection"):
+        detections = detect_and_crop_batch(images)
+
+    # Pool every image's crops so the binary classifier sees full batches
+    pooled = [crop for crops, _ in detections for crop in crops]
+    with stage("binary_filter"):
+        kept = {idx for idx, _ in binary_filter_teeth(pooled)}
+    count_crops("binary_filter", len(pooled), len(kept))
+
+    results = []
+    offset = 0
+    with stage("box_filter"):
+        for crops, boxes_info in detections:
+            indices = [i for i in range(len(crops)) if offset + i in kept]
+            offset += len(crops)
+            results.append(bounding_box_filter_iou(
+                [boxes_info[i] for i in indices], [crops[i] for i in indices], IOU_THRESHOLD
+            ))
+    count_crops("box_filter", len(kept), sum(len(crops) for _, crops in results))
+    return results
+
+
+def classify_detected_batch(detections):
+    """classify_detected over [(boxes, crops)] with one pooled classifier pass. Returns [predictions]."""
+    pooled = [crop for _, crops in detections for crop in crops]
+    with stage("classification"):
+        pooled_predictions = classify_teeth(pooled)
+
+    results = []
+    offset = 0
+    for boxes, crops in detections:
+        predictions = pooled_predictions[offset:offset + len(crops)]
+        offset += len(crops)
+        for i, (box, pred) in enumerate(zip(boxes, predictions)):
+            # Ids restart per image, as in classify_detected
+            pred['id'] = i
+            box['disease'] = pred['disease']
+        results.append(predictions)
+    return results
+
+
+def analyze_images(images):
+    """Full analysis of a series of decoded X-rays. Returns [(boxes, crops, predictions)]."""
+    detections = detect_teeth_batch(images)
+    predictions = classify_detected_batch(detections)
+    return [(boxes, crops, preds) for (boxes, crops), preds in zip(detections, predictions)]
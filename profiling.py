@@ -0,0 +1,101 @@
+import cProfile
+import functools
+import glob
+import os
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import make_response, request
+
+from batching import run_inline
+from config import PROFILING_TOKENS, PROFILE_DIR, PROFILE_MAX_TRACES
+
+PROFILE_HEADER = "X-Profile"
+TRACE_ID_HEADER = "X-Profile-Trace-Id"
+
+# True inside a profiled request, so report rendering runs in the request thread
+# instead of the report pool, where the profilers can see it
+_active = ContextVar("profiling_active", default=False)
+
+# torch.profiler is process-wide, so only one request is profiled at a time
+_session_lock = threading.Lock()
+
+
+def is_active():
+    return _active.get()
+
+
+def requested():
+    """True if the current request carries an allow-listed profiling token."""
+    token = request.headers.get(PROFILE_HEADER) or request.args.get("profile")
+    return bool(token) and token in PROFILING_TOKENS
+
+
+def _start_torch_profiler():
+    # In worker mode the web process never imports torch; there is nothing to trace here
+    if "torch" not in sys.modules:
+        return None
+    from torch.profiler import profile, ProfilerActivity
+    # No with_stack: torch's Python tracer would take over cProfile's profile hook
+    profiler = profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+    profiler.__enter__()
+    return profiler
+
+
+def _rotate(directory, max_traces):
+    """Delete the oldest traces so at most max_traces remain."""
+    stats = sorted(glob.glob(os.path.join(directory, "*.prof")), key=os.path.getmtime)
+    for path in stats[:max(0, len(stats) - max_traces)]:
+        for related in glob.glob(path[:-len(".prof")] + ".*"):
+            try:
+                os.remove(related)
+            except OSError:
+                pass
+
+
+def run_profiled(fn, name):
+    """
+    Run fn() under cProfile and, if torch is loaded, torch.profiler. Writes
+    <PROFILE_DIR>/<time>_<name>_<trace id>.prof and .trace.json (Chrome trace).
+    Returns (result, trace_id).
+    """
+    trace_id = uuid.uuid4().hex
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{name}_{trace_id}")
+
+    with _session_lock:
+        torch_profiler = _start_torch_profiler()
+        stats = cProfile.Profile()
+        token = _active.set(True)
+        stats.enable()
+        try:
+            # Classifier batches run in this thread rather than on the batcher threads
+            with run_inline():
+                result = fn()
+        finally:
+            stats.disable()
+            _active.reset(token)
+            stats.dump_stats(base + ".prof")
+            if torch_profiler is not None:
+                torch_profiler.__exit__(None, None, None)
+                torch_profiler.export_chrome_trace(base + ".trace.json")
+            _rotate(PROFILE_DIR, PROFILE_MAX_TRACES)
+
+    print(f"[INFO] Profiled {name} as trace {trace_id} in {base}.*")
+    return result, trace_id
+
+
+def profiled(view):
+    """View decorator: profile the request when it asks for it with an allow-listed token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not PROFILING_TOKENS or not requested():
+            return view(*args, **kwargs)
+        result, trace_id = run_profiled(lambda: view(*args, **kwargs), request.endpoint)
+        response = make_response(result)
+        response.headers[TRACE_ID_HEADER] = trace_id
+        return response
+    return wrapper
@@ -0,0 +1,195 @@
+"""
+Post-training static INT8 quantization of the binary and disease classifiers.
+
+Calibrates on a folder of saved tooth crops (e.g. the output of save_cropped_teeth),
+saves the INT8 models for the "quantized" classifier backend and writes a report of
+agreement with the FP32 models.
+
+    python quantize_models.py --calibration-dir saved_crops
+    python quantize_models.py --calibration-dir saved_crops --eval-dir held_out_crops --min-agreement 0.98
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+from torch import nn
+from torchvision.models import quantization as quantizable_models
+
+import binary_classifier
+import disease_classifier
+from backends import CLASSIFIER_WEIGHTS, quantized_path, set_quantization_engine
+from config import EXPORT_DIR, QUANTIZATION_ENGINE, TOOTH_PROB_THRESHOLD
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+CLASSIFIERS = {
+    "binary_classifier": binary_classifier,
+    "disease_classifier": disease_classifier,
+}
+
+
+def list_crops(folder, limit=None):
+    """Image files under folder (recursively), in a stable order."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    paths.sort()
+    return paths[:limit] if limit else paths
+
+
+def load_batches(paths, transform, batch_size):
+    for start in range(0, len(paths), batch_size):
+        tensors = []
+        for path in paths[start:start + batch_size]:
+            with Image.open(path) as crop:
+                tensors.append(transform(crop.convert("RGB")))
+        yield torch.stack(tensors)
+
+
+# === Quantization ===
+def quantize_classifier(module, calibration_paths, batch_size):
+    """Fuse, calibrate and convert a quantizable copy of the module's FP32 ResNet18."""
+    fp32 = module.build_eager_model()
+
+    model = quantizable_models.resnet18(weights=None, quantize=False)
+    model.fc = nn.Linear(model.fc.in_features, fp32.fc.out_features)
+    model.load_state_dict(fp32.state_dict())
+    model.eval()
+    model.fuse_model()
+    model.qconfig = torch.ao.quantization.get_default_qconfig(QUANTIZATION_ENGINE)
+    torch.ao.quantization.prepare(model, inplace=True)
+
+    # Observers record activation ranges on the calibration crops
+    with torch.inference_mode():
+        for batch in load_batches(calibration_paths, module.transform, batch_size):
+            model(batch)
+
+    torch.ao.quantization.convert(model, inplace=True)
+    with torch.inference_mode():
+        return fp32, torch.jit.freeze(torch.jit.script(model))
+
+
+# === Agreement report ===
+def _outputs(model, paths, transform, batch_size):
+    with torch.inference_mode():
+        return torch.cat([model(batch) for batch in load_batches(paths, transform, batch_size)])
+
+
+def _mean_latency_ms(model, batch_size, runs=5):
+    batch = torch.randn(batch_size, 3, 224, 224)
+    with torch.inference_mode():
+        model(batch)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(batch)
+    return round((time.perf_counter() - start) * 1000 / runs, 2)
+
+
+def binary_agreement(fp32_logits, int8_logits):
+    """Keep/drop agreement of binary_filter_teeth at TOOTH_PROB_THRESHOLD."""
+    fp32_probs = torch.sigmoid(fp32_logits).squeeze(1)
+    int8_probs = torch.sigmoid(int8_logits).squeeze(1)
+    fp32_keep = fp32_probs >= TOOTH_PROB_THRESHOLD
+    int8_keep = int8_probs >= TOOTH_PROB_THRESHOLD
+    total = len(fp32_keep)
+    return {
+        "threshold": TOOTH_PROB_THRESHOLD,
+        "crops": total,
+        "agreement": round((fp32_keep == int8_keep).sum().item() / total, 4),
+        "kept_by_fp32_only": int((fp32_keep & ~int8_keep).sum()),
+        "kept_by_int8_only": int((~fp32_keep & int8_keep).sum()),
+        "max_prob_diff": round((fp32_probs - int8_probs).abs().max().item(), 4),
+    }
+
+
+def disease_agreement(fp32_logits, int8_logits):
+    """Argmax agreement of classify_teeth, overall and per FP32-predicted class."""
+    fp32_pred = fp32_logits.argmax(dim=1)
+    int8_pred = int8_logits.argmax(dim=1)
+    matches = fp32_pred == int8_pred
+
+    per_class = {}
+    for idx, name in enumerate(disease_classifier.class_names):
+        mask = fp32_pred == idx
+        count = int(mask.sum())
+        per_class[name] = {
+            "crops": count,
+            "agreement": round(matches[mask].sum().item() / count, 4) if count else None,
+        }
+
+    return {
+        "crops": len(matches),
+        "agreement": round(matches.sum().item() / len(matches), 4),
+        "per_class": per_class,
+        "max_prob_diff": round((fp32_logits.softmax(1) - int8_logits.softmax(1)).abs().max().item(), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calibration-dir", required=True, help="Folder of saved tooth crops used to calibrate")
+    parser.add_argument("--eval-dir", help="Folder of crops for the agreement report (defaults to the calibration crops)")
+    parser.add_argument("--models", nargs="+", choices=sorted(CLASSIFIERS), default=sorted(CLASSIFIERS))
+    parser.add_argument("--max-calibration", type=int, default=512, help="Use at most this many calibration crops")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--report", default=os.path.join(EXPORT_DIR, "quantization_report.json"))
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="Exit non-zero if any model's overall agreement is below this")
+    args = parser.parse_args(argv)
+
+    calibration_paths = list_crops(args.calibration_dir, args.max_calibration)
+    eval_paths = list_crops(args.eval_dir) if args.eval_dir else calibration_paths
+    if not calibration_paths or not eval_paths:
+        parser.error("no crops found to calibrate on or evaluate")
+
+    set_quantization_engine()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+
+    report = {
+        "engine": QUANTIZATION_ENGINE,
+        "calibration_crops": len(calibration_paths),
+        "eval_crops": len(eval_paths),
+        "models": {},
+    }
+    failed = False
+    for name in args.models:
+        module = CLASSIFIERS[name]
+        fp32, int8 = quantize_classifier(module, calibration_paths, args.batch_size)
+        path = quantized_path(name)
+        int8.save(path)
+        print(f"[INFO] Saved INT8 {name} to {path}")
+
+        fp32_logits = _outputs(fp32, eval_paths, module.transform, args.batch_size)
+        int8_logits = _outputs(int8, eval_paths, module.transform, args.batch_size)
+        if name == "binary_classifier":
+            result = binary_agreement(fp32_logits, int8_logits)
+        else:
+            result = disease_agreement(fp32_logits, int8_logits)
+
+        result["latency_ms"] = {
+            "fp32": _mean_latency_ms(fp32, args.batch_size),
+            "int8": _mean_latency_ms(int8, args.batch_size),
+            "batch_size": args.batch_size,
+        }
+        result["size_bytes"] = {
+            "fp32": os.path.getsize(CLASSIFIER_WEIGHTS[name]),
+            "int8": os.path.getsize(path),
+        }
+        report["models"][name] = result
+
+        ok = result["agreement"] >= args.min_agreement
+        failed |= not ok
+        print(f"[{'OK' if ok else 'FAIL'}] {name}: agreement {result['agreement']:.2%} on {result['crops']} crops, "
+              f"{result['latency_ms']['fp32']}ms -> {result['latency_ms']['int8']}ms per batch of {args.batch_size}")
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Wrote agreement report to {args.report}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.report_generator import generate_pdf_report
+
+REPORT_PENDING = "pending"
+REPORT_DONE = "done"
+REPORT_FAILED = "failed"
+
+
+def report_id_for(*parts):
+    """Deterministic report ID (UUID formatted) for identical report inputs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, (bytes, bytearray)):
+            part = json.dumps(part, sort_keys=True, default=str).encode()
+        digest.update(part)
+    return str(uuid.UUID(hex=digest.hexdigest()[:32]))
+
+
+def report_filename(report_id):
+    return f"dental_report_{report_id}.pdf"
+
+
+def _render(report_data, output_path):
+    """Runs in a pool process: render to a temp file, then publish it atomically."""
+    # The writer creates its own directory, in case retention pruned it while the report was queued
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        generate_pdf_report(report_data, tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+class ReportRenderPool:
+    """
+    Renders PDF reports in worker processes (ReportLab is pure-Python and
+    CPU-bound) so they don't hold the web process's GIL. Reports are
+    deduplicated by ID: an ID that is already rendered or in flight is
+    never rendered again. If a render process dies (OOM, a crash in native
+    code), its reports fail and the pool is replaced.
+    """
+
+    def __init__(self, reports, max_workers=2):
+        self.reports = reports  # storage.StorageArea for the rendered PDFs
+        self.max_workers = max_workers
+        self._executor = self._new_executor()
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context("spawn"))
+
+    def _replace_executor_locked(self, broken):
+        """Swap in a fresh executor, unless another thread already replaced the broken one."""
+        if self._executor is broken:
+            print("[ERROR] A report render process died; starting a new report pool")
+            self._executor = self._new_executor()
+            broken.shutdown(wait=False)
+
+    def report_path(self, report_id):
+        """Where a report is rendered to: its sharded location in the reports directory."""
+        return self.reports.path(report_id, report_filename(report_id))
+
+    def existing_path(self, report_id):
+        """Path of a rendered report, including ones from before sharding, or None."""
+        return self.reports.find(report_id, report_filename(report_id))
+
+    def submit(self, report_id, report_data):
+        """
+        Queue a report unless it already exists or is being rendered. Returns its future or None.
+        report_data may be a function building it, called only if the report has to be rendered.
+        """
+        with self._lock:
+            future = self._futures.get(report_id)
+            if future is not None and not (future.done() and future.exception() is not None):
+                return future
+            if self.existing_path(report_id) is not None:
+                return None
+
+            if not callable(report_data):
+                future, executor = self._submit_locked(report_id, report_data)
+        if callable(report_data):
+            # Build the inputs outside the lock, then check again: another request may have queued it
+            return self.submit(report_id, report_data())
+        # Outside the lock: the callback runs right away if the render has already finished
+        future.add_done_callback(lambda f: self._forget(report_id, f, executor))
+        return future
+
+    def _submit_locked(self, report_id, report_data):
+        """Queue the render, on a fresh executor if the current one is broken. Returns (future, executor)."""
+        try:
+            future = self._executor.submit(_render, report_data, self.report_path(report_id))
+        except BrokenProcessPool:
+            self._replace_executor_locked(self._executor)
+            future = self._executor.submit(_render, report_data, self.report_path(report_id))
+        self._futures[report_id] = future
+        return future, self._executor
+
+    def render_here(self, report_id, report_data):
+        """Render in the calling thread, replacing any existing file (used when profiling)."""
+        if callable(report_data):
+            report_data = report_data()
+        return _render(report_data, self.report_path(report_id))
+
+    def status(self, report_id):
+        """Return (status, error) for a report, or (None, None) if it is unknown."""
+        with self._lock:
+            future = self._futures.get(report_id)
+        if future is not None:
+            if not future.done():
+                return REPORT_PENDING, None
+            if future.exception() is not None:
+                return REPORT_FAILED, str(future.exception())
+        if self.existing_path(report_id) is not None:
+            return REPORT_DONE, None
+        return None, None
+
+    def _forget(self, report_id, future, executor):
+        # Finished renders are served from disk; only failures stay around to report their error
+        with self._lock:
+            if isinstance(future.exception(), BrokenProcessPool):
+                # The report stays failed; the next submit gets a working pool
+                self._replace_executor_locked(executor)
+            elif future.exception() is None and self._futures.get(report_id) is future:
+                del self._futures[report_id]
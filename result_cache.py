@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def config_fingerprint(settings, weight_paths=()):
+    """
+    Hash of everything besides the upload that changes an analysis result:
+    thresholds/settings plus the identity (size, mtime) of each weights file.
+    """
+    weights = {}
+    for path in weight_paths:
+        try:
+            stat = os.stat(path)
+            weights[path] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            weights[path] = None
+    blob = json.dumps({"settings": settings, "weights": weights}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of serialized analysis responses.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes plus a configuration
+    fingerprint. Lookups go to an in-memory LRU tier bounded by total bytes,
+    then to an optional on-disk tier with oldest-first eviction by total size.
+    """
+
+    def __init__(self, fingerprint, memory_max_bytes=256 * 1024 * 1024, disk_dir=None, disk_max_bytes=0):
+        self.fingerprint = fingerprint
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Disk entries (key -> size), least recently used first. Built once at startup,
+        # so lookups and eviction never scan the cache directory.
+        self._disk_index = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            for path, _, size in sorted(self._disk_entries(), key=lambda entry: entry[1]):
+                self._disk_index[os.path.basename(path)[:-len(".json")]] = size
+            self._disk_bytes = sum(self._disk_index.values())
+
+    def content_key(self, data):
+        """Identity of an upload under the current configuration, shared by all response variants."""
+        return f"{hashlib.sha256(data).hexdigest()}-{self.fingerprint}"
+
+    def variant_key(self, content_key, variant=""):
+        return f"{content_key}-{variant}"
+
+    def key(self, data, variant=""):
+        """Cache key for uploaded bytes and a response variant (e.g. full or compact)."""
+        return self.variant_key(self.content_key(data), variant)
+
+    def get(self, key, valid=None):
+        """
+        Return the cached bytes for key, or None on a miss. valid(value), if given, can
+        reject an entry the caller cannot use; that counts as a miss, so hits are only
+        counted for values that are actually served.
+        """
+        value, tier = self._lookup(key)
+        if value is not None and valid is not None and not valid(value):
+            value = None
+        with self._lock:
+            if value is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self.counters[f"{tier}_hits"] += 1
+            return value
+
+    def peek(self, key):
+        """Cached bytes for key, or None, without counting a hit or miss (for auxiliary records)."""
+        return self._lookup(key)[0]
+
+    def _lookup(self, key):
+        """Return (value, tier) with tier "memory" or "disk", or (None, None)."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                return value, "memory"
+            on_disk = key in self._disk_index
+
+        # Disk reads happen outside the lock, so they never hold up memory hits
+        value = self._disk_get(key) if on_disk else None
+        with self._lock:
+            if value is None:
+                if on_disk and key in self._disk_index:
+                    # The file went away under the index (e.g. removed by hand)
+                    self._disk_bytes -= self._disk_index.pop(key)
+                return None, None
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+            self._memory_put(key, value)
+            return value, "disk"
+
+    def put(self, key, value):
+        with self._lock:
+            self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self.counters,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+                disk_bytes=self._disk_bytes,
+            )
+
+    # === In-memory LRU tier ===
+    def _memory_put(self, key, value):
+        if len(value) > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    # === On-disk tier ===
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        for dirpath, _, filenames in os.walk(self.disk_dir):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue  # Temp files left by an interrupted write
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path)  # Keeps the recency order across restarts
+        except OSError:
+            return None  # Evicted in the meantime
+        return value
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir or len(value) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        # Only the index is updated under the lock; evicted files are removed after it
+        evicted = []
+        with self._lock:
+            self._disk_bytes += len(value) - self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(value)
+            while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+                old_key, size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= size
+                self.counters["evictions"] += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._disk_path(old_key))
+            except OSError:
+                pass
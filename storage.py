@@ -0,0 +1,182 @@
+import hashlib
+import os
+import threading
+import time
+
+# Empty shard directories younger than this are left alone, so the cleaner never
+# removes a directory a writer has just created
+EMPTY_DIR_GRACE_S = 60
+
+
+def shard_dirs(key, depth=2):
+    """Two-hex-character directory levels derived from a hash of key."""
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return [digest[2 * i:2 * i + 2] for i in range(depth)]
+
+
+def write_atomic(path, data):
+    """Write to a temp file next to path, then publish it in one rename. Creates the directory."""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(tmp_path, 'wb')
+        except FileNotFoundError:
+            # An old, empty directory was pruned by the cleaner between the two calls
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = open(tmp_path, 'wb')
+        with f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+class StorageArea:
+    """
+    One artifact directory (e.g. stored X-rays or reports) split into hash-sharded
+    subdirectories, so no single directory grows to hundreds of thousands of entries.
+    """
+
+    def __init__(self, root, shard_depth=2):
+        self.root = root
+        self.shard_depth = shard_depth
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key, filename):
+        """
+        Sharded path of filename, placed by key. Only computes the path: the writer
+        creates the directories, so the cleaner cannot prune them before the write.
+        """
+        return os.path.join(self.root, *shard_dirs(key, self.shard_depth), filename)
+
+    def directory(self, key):
+        """Sharded directory named after key (e.g. one per request). The writer creates it."""
+        return os.path.join(self.root, *shard_dirs(key, self.shard_depth), key)
+
+    def find(self, key, filename):
+        """Existing path of filename: the sharded location, else the legacy flat one. None if absent."""
+        for path in (
+            os.path.join(self.root, *shard_dirs(key, self.shard_depth), filename),
+            os.path.join(self.root, filename),
+        ):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def content_path(self, data, extension=""):
+        """Where put_content stores these bytes."""
+        digest = hashlib.sha256(data).hexdigest()
+        return self.path(digest, digest + extension)
+
+    def put_content(self, data, extension=""):
+        """
+        Store bytes under their SHA-256, so identical uploads are kept once. Returns the
+        path. Storing existing content again refreshes its age for retention.
+        """
+        path = self.content_path(data, extension)
+        if os.path.exists(path):
+            try:
+                os.utime(path)
+                return path
+            except OSError:
+                pass  # Removed by the cleaner in the meantime; write it again
+        return write_atomic(path, data)
+
+    def entries(self):
+        """(path, mtime, size) of every file below the root, legacy flat files included."""
+        stack = [self.root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif not entry.name.endswith(".tmp"):
+                                stat = entry.stat(follow_symlinks=False)
+                                yield entry.path, stat.st_mtime, stat.st_size
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def prune_empty_dirs(self, now):
+        for dirpath, _, _ in os.walk(self.root, topdown=False):
+            if dirpath == self.root:
+                continue
+            try:
+                if now - os.path.getmtime(dirpath) > EMPTY_DIR_GRACE_S:
+                    os.rmdir(dirpath)  # Fails, as intended, unless the directory is empty
+            except OSError:
+                pass
+
+
+class StorageManager:
+    """
+    The service's artifact areas plus a retention policy shared by all of them: files
+    older than max_age_s are deleted, then the oldest files until the total size is at
+    most max_bytes. Zero disables either limit. Cleanup runs on a background thread.
+    """
+
+    def __init__(self, max_age_s=0, max_bytes=0, cleanup_interval_s=300, shard_depth=2):
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self.cleanup_interval_s = cleanup_interval_s
+        self.shard_depth = shard_depth
+        self.areas = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._cleaner = None
+
+    def area(self, name, root):
+        self.areas[name] = StorageArea(root, self.shard_depth)
+        return self.areas[name]
+
+    def cleanup(self, now=None):
+        """Apply the retention policy once. Returns (files deleted, bytes deleted)."""
+        now = now or time.time()
+        with self._lock:
+            entries = [entry for area in self.areas.values() for entry in area.entries()]
+            total = sum(size for _, _, size in entries)
+            deleted_files = deleted_bytes = 0
+
+            for path, mtime, size in sorted(entries, key=lambda entry: entry[1]):
+                expired = self.max_age_s and now - mtime > self.max_age_s
+                over_budget = self.max_bytes and total > self.max_bytes
+                if not expired and not over_budget:
+                    break  # Oldest first: nothing newer is expired either
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                deleted_files += 1
+                deleted_bytes += size
+
+            for area in self.areas.values():
+                area.prune_empty_dirs(now)
+
+        if deleted_files:
+            print(f"[INFO] Storage cleanup removed {deleted_files} files ({deleted_bytes} bytes)")
+        return deleted_files, deleted_bytes
+
+    def start_cleaner(self):
+        """Run cleanup every cleanup_interval_s seconds on a daemon thread, if a limit is set."""
+        if self._cleaner is not None or not (self.max_age_s or self.max_bytes):
+            return
+        self._cleaner = threading.Thread(target=self._run_cleaner, name="storage-cleaner", daemon=True)
+        self._cleaner.start()
+
+    def stop_cleaner(self):
+        self._stop.set()
+
+    def _run_cleaner(self):
+        while not self._stop.is_set():
+            try:
+                self.cleanup()
+            except Exception as e:
+                print(f"[ERROR] Storage cleanup failed: {e}")
+            self._stop.wait(self.cleanup_interval_s)
@@ -0,0 +1,45 @@
+"""
+Exported classifiers must match eager PyTorch. Uses the random-weight ResNet18 from the
+benchmarks, so it runs without the proprietary weights.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+import torch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "benchmarks")]
+
+from backends import EXPORT_SUFFIXES, OnnxClassifier  # noqa: E402
+from export_models import export_model  # noqa: E402
+from synthetic import random_resnet18  # noqa: E402
+
+ATOL = 1e-4
+
+
+def _load(path, fmt):
+    if fmt == "torchscript":
+        return torch.jit.load(path, map_location="cpu").eval()
+    pytest.importorskip("onnxruntime")
+    return OnnxClassifier(path)
+
+
+@pytest.mark.parametrize("fmt", sorted(EXPORT_SUFFIXES))
+def test_exported_classifier_matches_eager(tmp_path, fmt):
+    if fmt == "onnx":
+        pytest.importorskip("onnxscript")  # Needed by the torch.onnx exporter
+    eager = random_resnet18(7, seed=0)
+    path = export_model(eager, str(tmp_path / f"classifier{EXPORT_SUFFIXES[fmt]}"), fmt)
+    exported = _load(path, fmt)
+
+    torch.manual_seed(0)
+    for batch_size in (1, 5):  # Exported with a batch of 2: the batch axis must stay dynamic
+        batch = torch.randn(batch_size, 3, 224, 224)
+        with torch.inference_mode():
+            expected = eager(batch)
+            actual = exported(batch)
+        assert actual.shape == expected.shape
+        assert torch.allclose(actual, expected, atol=ATOL), (actual - expected).abs().max().item()
@@ -1,4 +1,5 @@
 import os
+from io import BytesIO
 from PIL import Image, ImageDraw
 
 def get_disease_color(disease):
@@ -15,39 +16,79 @@ def get_disease_color(disease):
     }
     return color_map.get(disease, (255, 0, 0))  # default to red if not found
 
-def draw_boxes(image_path, boxes, output_path, width=10):
-    """Draw bounding boxes on an image and save it."""
-    img = Image.open(image_path).convert('RGB')
+def decode_image(data):
+    """Decode uploaded image bytes into the RGB image shared by every pipeline stage."""
+    return Image.open(BytesIO(data)).convert('RGB')
+
+def load_rgb(image):
+    """Return an RGB PIL image from a file path or an already decoded PIL image."""
+    if isinstance(image, Image.Image):
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    return Image.open(image).convert('RGB')
+
+def crop_boxes(image, boxes, ratio=0.1):
+    """Cut each box grown by ratio of its size on every side, clipped to the image (as the detector crops)."""
+    width, height = image.size
+    crops = []
+    for box in boxes:
+        dx = (box['x2'] - box['x1']) * ratio
+        dy = (box['y2'] - box['y1']) * ratio
+        crops.append(image.crop((
+            int(min(max(box['x1'] - dx, 0), width)),
+            int(min(max(box['y1'] - dy, 0), height)),
+            int(min(max(box['x2'] + dx, 0), width)),
+            int(min(max(box['y2'] + dy, 0), height)),
+        )))
+    return crops
+
+def make_thumbnail(image, max_size=128):
+    """Return a downscaled copy whose longest side is at most max_size."""
+    thumb = image.copy()
+    thumb.thumbnail((max_size, max_size))
+    return thumb
+
+def _draw_box(draw, box, width=10):
+    color = get_disease_color(box.get('disease', 'Unknown'))
+    draw.rectangle(
+        [(box['x1'], box['y1']), (box['x2'], box['y2'])],
+        outline=color,
+        width=width
+    )
+
+def annotate_image(image, boxes, width=10):
+    """Return a copy of the image with all boxes drawn on it, without touching disk."""
+    img = load_rgb(image).copy()
     draw = ImageDraw.Draw(img)
-    
     for box in boxes:
-        color = get_disease_color(box.get('disease', 'Unknown'))
-        draw.rectangle(
-            [(box['x1'], box['y1']), (box['x2'], box['y2'])],
-            outline=color,
-            width=width
-        )
-    
+        _draw_box(draw, box, width)
+    return img
+
+def iter_tooth_annotations(image, boxes, width=10):
+    """
+    Yield one annotated image per box, each drawn on a copy of a single decoded base.
+    Images are produced lazily so only one full-size copy is alive at a time.
+    """
+    base = load_rgb(image)
+    for box in boxes:
+        img = base.copy()
+        _draw_box(ImageDraw.Draw(img), box, width)
+        yield img
+
+def draw_boxes(image_path, boxes, output_path, width=10):
+    """Draw bounding boxes on an image and save it."""
+    img = annotate_image(image_path, boxes, width)
     img.save(output_path)
     return img
 
 def save_annotated_images(image_path, boxes, output_dir="annotated_xrays_single_tooth"):
     """Save individual annotated images for each tooth and a final combined image."""
     os.makedirs(output_dir, exist_ok=True)
-    
+    base = load_rgb(image_path)
+
     # Save individual tooth annotations
-    for idx, box in enumerate(boxes):
-        output_path = os.path.join(output_dir, f"tooth_{idx}.jpg")
-        img = Image.open(image_path).convert('RGB')
-        draw = ImageDraw.Draw(img)
-        color = get_disease_color(box.get('disease', 'Unknown'))
-        draw.rectangle(
-            [(box['x1'], box['y1']), (box['x2'], box['y2'])],
-            outline=color,
-            width=10
-        )
-        img.save(output_path)
-    
+    for idx, img in enumerate(iter_tooth_annotations(base, boxes)):
+        img.save(os.path.join(output_dir, f"tooth_{idx}.jpg"))
+
     # Save final image with all boxes
     final_output = os.path.join(output_dir, "final_yolo_output.jpg")
-    draw_boxes(image_path, boxes, final_output)
+    annotate_image(base, boxes).save(final_output)
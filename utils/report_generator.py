@@ -1,5 +1,6 @@
 import os
 import datetime
+import logging
 from PIL import Image
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as ReportLabImage, Table, TableStyle
@@ -10,6 +11,8 @@ from io import BytesIO
 import base64
 from .image_processing import get_disease_color
 
+logger = logging.getLogger(__name__)
+
 # Define dental health scoring system
 DISEASE_SEVERITY = {
     "Healthy": 0,
@@ -114,6 +117,14 @@ def decode_base64_image(base64_string):
         # Return a blank image as fallback
         return Image.new('RGB', (100, 100), color=(200, 200, 200))
 
+def load_report_image(value):
+    """Accept a PIL Image, raw encoded image bytes or a base64 string and return a PIL Image."""
+    if isinstance(value, Image.Image):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return Image.open(BytesIO(value))
+    return decode_base64_image(value)
+
 def pil_to_reportlab_image(pil_img, width=6*inch, max_height=7*inch):
     """
     Convert PIL image to ReportLab Image object with size constraints.
@@ -143,11 +154,12 @@ def generate_pdf_report(report_data, output_path):
     Generate a comprehensive dental analysis PDF report.
     
     Args:
-        report_data: Dict containing original_image, annotated_image, teeth_by_disease
+        report_data: Dict containing original_image, annotated_image, teeth_by_disease.
+            Images may be base64 strings (from the frontend) or PIL Images (from a stored analysis)
         output_path: Path where to save the PDF
     """
     # Debug the structure of the incoming data
-    print("[DEBUG] Report data keys:", report_data.keys())
+    logger.debug("Report data keys: %s", list(report_data.keys()))
     
     # Check if the structure matches what we expect
     if 'original_image' not in report_data or 'annotated_image' not in report_data or 'teeth_by_disease' not in report_data:
@@ -182,7 +194,7 @@ def generate_pdf_report(report_data, output_path):
         # Use the converted data
         report_data = converted_data
         
-    print("[DEBUG] Using report data with keys:", report_data.keys())
+    logger.debug("Using report data with keys: %s", list(report_data.keys()))
     
     doc = SimpleDocTemplate(output_path, pagesize=letter)
     styles = getSampleStyleSheet()
@@ -240,8 +252,8 @@ def generate_pdf_report(report_data, output_path):
     
     # Convert base64 images to ReportLab images
     try:
-        original_img = decode_base64_image(report_data['original_image'])
-        annotated_img = decode_base64_image(report_data['annotated_image'])
+        original_img = load_report_image(report_data['original_image'])
+        annotated_img = load_report_image(report_data['annotated_image'])
         
         # Add the annotated X-ray image
         elements.append(pil_to_reportlab_image(annotated_img))
@@ -293,8 +305,8 @@ def generate_pdf_report(report_data, output_path):
                 for tooth in sample_teeth:
                     if 'image' in tooth:
                         try:
-                            print(f"Processing tooth image for disease: {disease}")
-                            img = decode_base64_image(tooth['image'])
+                            logger.debug("Processing tooth image for disease: %s", disease)
+                            img = load_report_image(tooth['image'])
                             # Use the same function signature as defined above
                             rl_img = pil_to_reportlab_image(img, width=1.75*inch)
                             tooth_images.append(rl_img)
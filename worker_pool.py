@@ -0,0 +1,228 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+import metrics
+
+# Pipeline functions a worker is allowed to run, by name
+WORKER_FUNCTIONS = ("analyze_image", "detect_teeth", "classify_detected", "classify_teeth")
+
+# Task IDs used by workers to report that their models are loaded and warm, and
+# which task they have just picked up
+READY_MESSAGE = "ready"
+STARTED_MESSAGE = "started"
+
+# How often the result collector checks that the workers are alive, and the minimum
+# time between respawns of one worker, so a worker that fails at startup cannot spin
+LIVENESS_CHECK_S = 1.0
+RESPAWN_BACKOFF_S = 5.0
+
+
+def _worker_main(worker_idx, num_threads, pin_cpus, task_queue, result_queue):
+    """Worker process entry point: owns its own copy of the models."""
+    import logging
+    import torch
+    from config import LOG_LEVEL
+    logging.basicConfig(level=LOG_LEVEL)
+    torch.set_num_threads(num_threads)
+    if pin_cpus and hasattr(os, "sched_setaffinity"):
+        cpus = range(worker_idx * num_threads, (worker_idx + 1) * num_threads)
+        os.sched_setaffinity(0, {cpu % os.cpu_count() for cpu in cpus})
+
+    import pipeline  # Registers the models inside this process
+    from model_registry import registry
+    registry.load_all()
+    result_queue.put((READY_MESSAGE, worker_idx, registry.status()))
+
+    functions = {
+        "analyze_image": pipeline.analyze_image,
+        "detect_teeth": pipeline.detect_teeth,
+        "classify_detected": pipeline.classify_detected,
+        "classify_teeth": pipeline.classify_teeth,
+    }
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, fn_name, image_spec, args = task
+        result_queue.put((STARTED_MESSAGE, worker_idx, task_id))
+        try:
+            if image_spec is not None:
+                args = (_image_from_shared_memory(*image_spec),) + tuple(args)
+            # Stage timings and crop counts go back with the result, for the web process's /metrics
+            with metrics.recording() as events:
+                result = functions[fn_name](*args)
+            result_queue.put((task_id, (result, events), None))
+        except Exception as e:
+            result_queue.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+def _image_from_shared_memory(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Image.fromarray copies the pixels, so the segment can be released right away
+        return Image.fromarray(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    finally:
+        shm.close()
+
+
+class InferenceWorkerPool:
+    """
+    N spawned processes that own the models. Decoded images are handed over
+    through shared memory; everything else (boxes, crops, predictions)
+    travels over the result queue. A worker that dies fails the task it was
+    running and is respawned.
+    """
+
+    def __init__(self, num_workers, threads_per_worker=1, pin_cpus=False, task_timeout=120):
+        self._ctx = mp.get_context("spawn")
+        self.task_timeout = task_timeout
+        self.threads_per_worker = threads_per_worker
+        self.pin_cpus = pin_cpus
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._running = {}  # Worker index -> ID of the task it picked up last
+        self._spawned_at = {}
+        self._stopping = False
+        self.worker_status = {}
+
+        self._workers = [self._spawn(idx) for idx in range(num_workers)]
+
+        self._collector = threading.Thread(target=self._collect_results, name="inference-results", daemon=True)
+        self._collector.start()
+
+    def _spawn(self, idx):
+        worker = self._ctx.Process(
+            target=_worker_main,
+            args=(idx, self.threads_per_worker, self.pin_cpus, self._tasks, self._results),
+            name=f"inference-worker-{idx}",
+            daemon=True,
+        )
+        worker.start()
+        self._spawned_at[idx] = time.monotonic()
+        return worker
+
+    def submit(self, fn_name, *args, image=None):
+        """Run a pipeline function in a worker. If image is given it is passed first via shared memory."""
+        if fn_name not in WORKER_FUNCTIONS:
+            raise ValueError(f"Unknown worker function: {fn_name}")
+
+        shm = None
+        image_spec = None
+        if image is not None:
+            pixels = np.asarray(image.convert("RGB"), dtype=np.uint8)
+            shm = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+            np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[:] = pixels
+            image_spec = (shm.name, pixels.shape)
+
+        future = Future()
+        task_id = next(self._ids)
+        future.task_id = task_id
+        with self._pending_lock:
+            self._pending[task_id] = (future, shm)
+        self._tasks.put((task_id, fn_name, image_spec, args))
+        return future
+
+    def wait(self, future):
+        """Wait for a submitted task and record its stage metrics in this process."""
+        try:
+            result, events = future.result(timeout=self.task_timeout)
+        except TimeoutError:
+            # Nobody will wait for a late result: release the task's shared memory now
+            self._release(future.task_id)
+            future.cancel()
+            raise
+        metrics.replay(events)
+        return result
+
+    def run(self, fn_name, *args, image=None):
+        """Submit and wait for the result."""
+        return self.wait(self.submit(fn_name, *args, image=image))
+
+    def _release(self, task_id):
+        """Forget a task and free its shared memory. Returns its future, or None if already released."""
+        with self._pending_lock:
+            future, shm = self._pending.pop(task_id, (None, None))
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        return future
+
+    def _finish(self, task_id, result=None, error=None):
+        future = self._release(task_id)
+        if future is None or not future.set_running_or_notify_cancel():
+            return  # Timed out and cancelled by the waiter
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(result)
+
+    def _collect_results(self):
+        while True:
+            try:
+                task_id, result, error = self._results.get(timeout=LIVENESS_CHECK_S)
+            except queue.Empty:
+                self._check_workers()
+                continue
+
+            if task_id == READY_MESSAGE:
+                # result is the worker index, error carries its registry status
+                self.worker_status[result] = error
+                continue
+            if task_id == STARTED_MESSAGE:
+                # result is the worker index, error the task it picked up
+                self._running[result] = error
+                continue
+
+            for idx, running in list(self._running.items()):
+                if running == task_id:
+                    del self._running[idx]
+            self._finish(task_id, result, error)
+            self._check_workers()
+
+    def _check_workers(self):
+        """Fail the task of any worker that has died and respawn it."""
+        if self._stopping:
+            return
+        for idx, worker in enumerate(self._workers):
+            if worker.exitcode is None:
+                continue
+            task_id = self._running.pop(idx, None)
+            if task_id is not None:
+                self._finish(task_id, error=f"Inference worker {idx} died (exit code {worker.exitcode})")
+            # Not ready again until the replacement reports its models loaded
+            self.worker_status.pop(idx, None)
+            if time.monotonic() - self._spawned_at[idx] < RESPAWN_BACKOFF_S:
+                continue
+            print(f"[ERROR] Inference worker {idx} exited with code {worker.exitcode}; respawning")
+            self._workers[idx] = self._spawn(idx)
+
+    def is_ready(self):
+        """True while every worker is alive and has reported its models loaded and warm."""
+        if any(worker.exitcode is not None for worker in self._workers):
+            return False
+        return len(self.worker_status) == len(self._workers) and all(
+            model["loaded"] and model["error"] is None
+            for status in self.worker_status.values()
+            for model in status.values()
+        )
+
+    def shutdown(self):
+        self._stopping = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)